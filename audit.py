@@ -0,0 +1,206 @@
+"""
+Write-behind audit log and non-blocking logging
+- Structured JSON-lines records of queries, image analyses and alerts
+- Bounded in-memory queue drained by a background writer that appends in
+  batches and fsyncs on a timer; records are dropped (and counted) when full
+- Size-based rotation with gzip compression off the writer thread
+- Queue-based application logging so handlers never block on log I/O
+"""
+
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _json_default(value):
+    """Serialize NumPy scalars and arrays that end up in records"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class AuditLog:
+    """Appends structured records to a JSON-lines file from a background thread"""
+
+    def __init__(self, path: str = "audit/audit.jsonl", max_queue: int = 10000, batch_size: int = 256,
+                 fsync_interval: float = 5.0, max_bytes: int = 50 * 1024 * 1024,
+                 backup_count: int = 10, compress: bool = True):
+        """
+        Initialize audit log
+
+        Args:
+            path: JSON-lines file records are appended to
+            max_queue: Records buffered in memory; further records are dropped while full
+            batch_size: Records written per append
+            fsync_interval: Seconds between fsyncs of the log file
+            max_bytes: Rotate the file once it reaches this size
+            backup_count: Rotated files kept
+            compress: Gzip rotated files in the background
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._writer: Optional[threading.Thread] = None
+        self._file = None
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.rotations = 0
+
+    def start(self) -> "AuditLog":
+        """Start the background writer"""
+        if self._writer is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._writer = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._writer.start()
+        return self
+
+    def record(self, kind: str, **fields) -> bool:
+        """
+        Queue a record without blocking; serialization happens on the writer thread
+
+        Returns:
+            False when the queue is full and the record was dropped
+        """
+        try:
+            self._queue.put_nowait({"ts": round(time.time(), 3), "type": kind, **fields})
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush queued records, fsync and stop the writer"""
+        if self._writer is None:
+            return
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        self._writer = None
+
+    def stats(self) -> Dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "queued": self._queue.qsize(),
+            "rotations": self.rotations,
+        }
+
+    # Writer thread
+
+    def _run(self) -> None:
+        self._file = open(self.path, "a", encoding="utf-8")
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if batch and batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+            try:
+                if batch:
+                    self._write(batch)
+                if self._unsynced and (stopping or time.monotonic() - self._last_fsync >= self.fsync_interval):
+                    self._fsync()
+            except Exception as e:
+                # Keep the writer alive; a full disk must not stop the bot
+                logger.error(f"Audit log write failed: {e}")
+        self._file.close()
+
+    def _next_batch(self) -> List:
+        """Wait for a record (at most until the next fsync is due), then drain up to batch_size"""
+        wait = self.fsync_interval if not self._unsynced else max(
+            0.0, self.fsync_interval - (time.monotonic() - self._last_fsync))
+        try:
+            batch = [self._queue.get(timeout=wait)]
+        except queue.Empty:
+            return []
+        while batch[-1] is not _STOP and len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict]) -> None:
+        lines = "".join(json.dumps(record, default=_json_default, separators=(",", ":")) + "\n"
+                        for record in batch)
+        self._file.write(lines)
+        self._file.flush()
+        self._unsynced = True
+        self.written += len(batch)
+        self.batches += 1
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _fsync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def _rotate(self) -> None:
+        """Move the full file aside and compress/prune it on a separate thread"""
+        self._fsync()
+        self._file.close()
+        rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}.{self.rotations}"
+        os.replace(self.path, rotated)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.rotations += 1
+        threading.Thread(target=self._compress_and_prune, args=(rotated,),
+                         name="audit-compress", daemon=True).start()
+
+    def _compress_and_prune(self, rotated: str) -> None:
+        try:
+            if self.compress:
+                with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(rotated)
+            pattern = f"{self.path}.*.gz" if self.compress else f"{self.path}.*"
+            backups = sorted(glob.glob(pattern), key=os.path.getmtime)
+            for old in backups[:-self.backup_count] if self.backup_count else backups:
+                os.remove(old)
+        except Exception as e:
+            logger.error(f"Audit log rotation failed for {rotated}: {e}")
+
+
+def start_queue_logging(format: str, level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue to a listener thread that does the I/O
+
+    Returns:
+        The started listener; call stop() at exit to flush remaining records
+    """
+    log_queue = queue.SimpleQueue()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(format))
+    listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+    # The queue carries the bare message; the listener applies the full format
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+    listener.start()
+    return listener
@@ -0,0 +1,174 @@
+"""
+Cheap pre-filter cascade in front of U-Net segmentation
+- Index-based gate on a downsampled frame (NDVI for multispectral, excess green for RGB)
+- Early exit for sky, water and bare-soil / non-field images
+- Skip-rate, latency-saved and labeled false-skip statistics
+
+Tune the threshold on a labeled sample set:
+    python cascade.py labels.csv            # rows: image_path,needs_segmentation (1/0)
+"""
+
+import csv
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeGate:
+    """Decides from a thumbnail whether full U-Net segmentation is worth running"""
+
+    def __init__(self, vegetation_threshold: float = 0.05, thumbnail_size: int = 64,
+                 ndvi_vegetation: float = 0.3, exg_vegetation: float = 0.1):
+        """
+        Initialize gate
+
+        Args:
+            vegetation_threshold: Minimum share of vegetation pixels needed to run segmentation
+            thumbnail_size: Longest side of the strided thumbnail the gate looks at
+            ndvi_vegetation: NDVI above which a multispectral pixel counts as vegetation
+            exg_vegetation: Excess-green (2g - r - b, chromatic) above which an RGB pixel counts
+        """
+        self.vegetation_threshold = vegetation_threshold
+        self.thumbnail_size = thumbnail_size
+        self.ndvi_vegetation = ndvi_vegetation
+        self.exg_vegetation = exg_vegetation
+
+        self.total = 0
+        self.skipped = 0
+        self.gate_seconds = 0.0
+        self.full_run_seconds = None  # moving average of segmentation latency (dense or sparse)
+        # Requests are gated on analysis worker threads
+        self._lock = threading.Lock()
+
+    def _thumbnail(self, image_array: np.ndarray) -> np.ndarray:
+        stride = max(1, max(image_array.shape[:2]) // self.thumbnail_size)
+        return image_array[::stride, ::stride].astype(np.float32)
+
+    def classify(self, image_array: np.ndarray) -> Dict:
+        """Gate decision for one frame, without touching statistics"""
+        if image_array.ndim != 3 or image_array.shape[2] < 3:
+            # Grayscale carries no vegetation signal; let the model decide
+            return {"run_segmentation": True, "reason": "grayscale", "vegetation_fraction": None}
+
+        small = self._thumbnail(image_array)
+        if small.shape[2] >= 5:
+            # Multispectral band order: Blue, Green, Red, Red Edge, NIR
+            green, red, nir = small[..., 1], small[..., 2], small[..., 4]
+            vegetation = (nir - red) / (nir + red + 1e-7) > self.ndvi_vegetation
+            water = (green - nir) / (green + nir + 1e-7) > 0.0  # NDWI
+            sky = np.zeros_like(vegetation)
+        else:
+            # Camera photos are RGB
+            red, green, blue = small[..., 0], small[..., 1], small[..., 2]
+            total = red + green + blue + 1e-7
+            r, g, b = red / total, green / total, blue / total
+            vegetation = (2 * g - r - b) > self.exg_vegetation
+            full_scale = np.iinfo(image_array.dtype).max if image_array.dtype.kind in "ui" else max(float(small.max()), 1.0)
+            brightness = total / (3 * full_scale)
+            sky = (b > r) & (b > g) & (brightness > 0.5)
+            water = (b > r) & (b >= g) & (brightness <= 0.5)
+
+        vegetation_fraction = float(vegetation.mean())
+        if vegetation_fraction >= self.vegetation_threshold:
+            return {"run_segmentation": True, "reason": "vegetation", "vegetation_fraction": vegetation_fraction}
+
+        if sky.mean() > 0.5:
+            reason = "sky"
+        elif water.mean() > 0.5:
+            reason = "water"
+        else:
+            reason = "no vegetation"
+        return {"run_segmentation": False, "reason": reason, "vegetation_fraction": vegetation_fraction}
+
+    def evaluate(self, image_array: np.ndarray) -> Dict:
+        """Gate one request and update skip statistics"""
+        start = time.perf_counter()
+        decision = self.classify(image_array)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.gate_seconds += seconds
+            self.total += 1
+            if not decision["run_segmentation"]:
+                self.skipped += 1
+        return decision
+
+    def record_full_run(self, seconds: float) -> None:
+        """Feed the latency of a segmentation run (dense or sparse), used to estimate time saved by skips"""
+        with self._lock:
+            if self.full_run_seconds is None:
+                self.full_run_seconds = seconds
+            else:
+                self.full_run_seconds = 0.9 * self.full_run_seconds + 0.1 * seconds
+
+    def stats(self) -> Dict:
+        """Skip rate and estimated latency saved so far"""
+        with self._lock:
+            total, skipped, gate_seconds = self.total, self.skipped, self.gate_seconds
+            full_run_seconds = self.full_run_seconds or 0.0
+        saved = skipped * full_run_seconds - gate_seconds
+        return {
+            "requests": total,
+            "skipped": skipped,
+            "skip_rate": round(skipped / total, 3) if total else 0.0,
+            "latency_saved_seconds": round(saved, 2),
+            "gate_ms_per_request": round(1000 * gate_seconds / total, 3) if total else 0.0,
+        }
+
+
+def evaluate_gate(gate: CascadeGate, samples: Iterable[Tuple[np.ndarray, bool]]) -> Dict:
+    """
+    Score the gate on labeled frames
+
+    Args:
+        gate: Gate to evaluate (its running statistics are not changed)
+        samples: (image_array, needs_segmentation) pairs
+
+    Returns:
+        dict with skip rate, false-skip rate (skipped frames that needed segmentation,
+        over all such frames) and mean gate latency
+    """
+    total = skipped = positives = false_skips = 0
+    seconds = 0.0
+    for image_array, needs_segmentation in samples:
+        start = time.perf_counter()
+        run = gate.classify(image_array)["run_segmentation"]
+        seconds += time.perf_counter() - start
+        total += 1
+        skipped += not run
+        positives += bool(needs_segmentation)
+        false_skips += bool(needs_segmentation) and not run
+    return {
+        "samples": total,
+        "skip_rate": round(skipped / total, 3) if total else 0.0,
+        "false_skip_rate": round(false_skips / positives, 3) if positives else 0.0,
+        "gate_ms": round(1000 * seconds / total, 3) if total else 0.0,
+    }
+
+
+def main(argv=None) -> None:
+    """Sweep the vegetation threshold over a labeled CSV of image paths"""
+    from PIL import Image
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(__doc__)
+        return
+
+    with open(argv[0], newline='') as f:
+        rows = [(path, label.strip() in ("1", "true", "yes")) for path, label in csv.reader(f)]
+    samples = [(np.array(Image.open(path)), label) for path, label in rows]
+
+    print(f"{'threshold':>10} {'skip_rate':>10} {'false_skip':>11} {'gate_ms':>8}")
+    for threshold in (0.01, 0.02, 0.05, 0.1, 0.15, 0.2, 0.3):
+        result = evaluate_gate(CascadeGate(vegetation_threshold=threshold), samples)
+        print(f"{threshold:>10} {result['skip_rate']:>10} {result['false_skip_rate']:>11} {result['gate_ms']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Incremental analysis for repeat scans of registered fields
+- Aligns a new frame to the previous scan with phase correlation
+- Per-tile change signatures (channel mean/std on a strided view)
+- Reruns U-Net only on changed tiles, reusing cached mask tiles and index stats
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Vegetation indices cached per tile, as (numerator band, denominator band) indices
+INDEX_BANDS = {"ndvi": (4, 2), "ndre": (4, 3), "gndvi": (4, 1)}
+
+
+def _grid_starts(length: int, tile_size: int) -> np.ndarray:
+    return np.arange(0, length, tile_size)
+
+
+def tile_boxes(height: int, width: int, tile_size: int) -> List[Tuple[int, int, int, int]]:
+    """Row-major (y0, x0, y1, x1) boxes covering the image"""
+    return [(y, x, min(y + tile_size, height), min(x + tile_size, width))
+            for y in _grid_starts(height, tile_size) for x in _grid_starts(width, tile_size)]
+
+
+def tile_means(values: np.ndarray, tile_size: int, stride: int = 1) -> np.ndarray:
+    """Per-tile means of a 2-D (or H, W, C) array sampled every ``stride`` pixels, row-major"""
+    sampled = values[::stride, ::stride]
+    step = max(1, tile_size // stride)
+    row_starts = _grid_starts(sampled.shape[0], step)
+    col_starts = _grid_starts(sampled.shape[1], step)
+    sums = np.add.reduceat(np.add.reduceat(sampled, row_starts, axis=0), col_starts, axis=1)
+    counts = np.outer(np.diff(np.append(row_starts, sampled.shape[0])),
+                      np.diff(np.append(col_starts, sampled.shape[1])))
+    if sums.ndim == 3:
+        counts = counts[..., None]
+    return (sums / counts).reshape(len(row_starts) * len(col_starts), -1)
+
+
+def tile_signatures(image_array: np.ndarray, tile_size: int, stride: int = 4) -> np.ndarray:
+    """Cheap per-tile change signature: channel means and standard deviations"""
+    image = image_array.astype(np.float32) if image_array.ndim == 3 else image_array[..., None].astype(np.float32)
+    means = tile_means(image, tile_size, stride)
+    squares = tile_means(image * image, tile_size, stride)
+    return np.concatenate([means, np.sqrt(np.maximum(squares - means * means, 0))], axis=1)
+
+
+def _intensity_scale(image_array: np.ndarray) -> float:
+    """Factor from 8-bit intensity units to the array's range (floats are taken as 0-1)"""
+    if np.issubdtype(image_array.dtype, np.integer):
+        return np.iinfo(image_array.dtype).max / 255.0
+    return 1.0 / 255.0
+
+
+def _gray_thumbnail(image_array: np.ndarray, stride: int) -> np.ndarray:
+    small = image_array[::stride, ::stride].astype(np.float32)
+    return small.mean(axis=2) if small.ndim == 3 else small
+
+
+def estimate_shift(reference: np.ndarray, frame: np.ndarray) -> Tuple[int, int]:
+    """
+    Translation of ``frame`` relative to ``reference`` by phase correlation
+
+    Returns:
+        (dy, dx) such that frame[y, x] ~= reference[y - dy, x - dx]
+    """
+    window = np.outer(np.hanning(reference.shape[0]), np.hanning(reference.shape[1]))
+    f_ref = np.fft.rfft2((reference - reference.mean()) * window)
+    f_new = np.fft.rfft2((frame - frame.mean()) * window)
+    cross = f_new * np.conj(f_ref)
+    correlation = np.fft.irfft2(cross / (np.abs(cross) + 1e-9), s=reference.shape)
+    dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+    # Peaks past the midpoint are negative shifts
+    if dy > reference.shape[0] // 2:
+        dy -= reference.shape[0]
+    if dx > reference.shape[1] // 2:
+        dx -= reference.shape[1]
+    return int(dy), int(dx)
+
+
+def align_frame(image_array: np.ndarray, dy: int, dx: int) -> np.ndarray:
+    """Undo a (dy, dx) shift, replicating edge pixels where the frame has no data"""
+    height, width = image_array.shape[:2]
+    rows = np.clip(np.arange(height) + dy, 0, height - 1)
+    cols = np.clip(np.arange(width) + dx, 0, width - 1)
+    return image_array[rows][:, cols]
+
+
+class FieldScanCache:
+    """Previous scan of one field: reference thumbnail, tile signatures, mask and stats"""
+
+    def __init__(self, shape, thumbnail, signatures, mask, index_means, heads, heads_time=None, dtype=None):
+        self.shape = tuple(shape)
+        # Pixel type of the frame (None for caches written before it was recorded)
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self.thumbnail = thumbnail
+        self.signatures = signatures
+        # Kept at the precision it is saved with, so a reloaded cache gives the same results
+        self.mask = np.asarray(mask, dtype=np.float16)
+        self.index_means = index_means
+        self.heads = heads
+        # When the NPK/yield heads last ran on a full frame
+        self.heads_time = heads_time
+
+    def save(self, path: str) -> None:
+        np.savez(path, shape=np.array(self.shape), thumbnail=self.thumbnail,
+                 signatures=self.signatures, mask=self.mask,
+                 dtype=np.array(self.dtype.str if self.dtype is not None else ""),
+                 index_means=self.index_means if self.index_means is not None else np.empty(0),
+                 heads=np.array(json.dumps(self.heads)),
+                 heads_time=np.array(self.heads_time if self.heads_time is not None else np.nan))
+
+    @classmethod
+    def load(cls, path: str) -> "FieldScanCache":
+        with np.load(path) as data:
+            index_means = data["index_means"]
+            heads_time = float(data["heads_time"]) if "heads_time" in data.files else np.nan
+            dtype = str(data["dtype"]) if "dtype" in data.files else ""
+            return cls(data["shape"], data["thumbnail"], data["signatures"], data["mask"],
+                       index_means if index_means.size else None,
+                       json.loads(str(data["heads"])),
+                       None if np.isnan(heads_time) else heads_time,
+                       dtype or None)
+
+
+class IncrementalAnalyzer:
+    """Reuses the previous scan of a field and reruns U-Net only on changed tiles"""
+
+    def __init__(self, cache_dir: str = "scan_cache", tile_size: int = 256, change_threshold: float = 6.0,
+                 signature_stride: int = 4, max_shift_fraction: float = 0.25,
+                 full_rerun_fraction: float = 0.5, max_cached_fields: int = 32):
+        """
+        Initialize incremental analyzer
+
+        Args:
+            cache_dir: Directory holding one .npz cache per field
+            tile_size: Tile side in pixels
+            change_threshold: Largest signature difference treated as unchanged, in 8-bit intensity
+                              units (scaled to the frame's dtype range, e.g. x257 for 16-bit)
+            signature_stride: Pixel stride used when computing signatures and the alignment thumbnail
+            max_shift_fraction: Larger estimated shifts are treated as a different view (full rerun)
+            full_rerun_fraction: Changed-tile share above which the whole frame is re-analyzed
+            max_cached_fields: Field caches kept in memory (others reload from disk)
+        """
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self.change_threshold = change_threshold
+        self.signature_stride = signature_stride
+        self.max_shift_fraction = max_shift_fraction
+        self.full_rerun_fraction = full_rerun_fraction
+        self.max_cached_fields = max_cached_fields
+        self._caches: "OrderedDict[str, FieldScanCache]" = OrderedDict()
+
+    def _cache_path(self, field_id: str) -> str:
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_-]+', '_', field_id) + ".npz")
+
+    def _get_cache(self, field_id: str) -> Optional[FieldScanCache]:
+        cache = self._caches.get(field_id)
+        if cache is None:
+            try:
+                cache = FieldScanCache.load(self._cache_path(field_id))
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable scan cache for {field_id}: {e}")
+                return None
+        self._put_cache(field_id, cache)
+        return cache
+
+    def _put_cache(self, field_id: str, cache: FieldScanCache) -> None:
+        self._caches[field_id] = cache
+        self._caches.move_to_end(field_id)
+        while len(self._caches) > self.max_cached_fields:
+            self._caches.popitem(last=False)
+
+    def _index_means(self, image_array: np.ndarray, boxes: List[Tuple[int, int, int, int]]) -> Optional[np.ndarray]:
+        """Per-tile mean NDVI, NDRE and GNDVI for the given boxes (multispectral only)"""
+        if image_array.ndim != 3 or image_array.shape[2] < 5:
+            return None
+        means = np.empty((len(boxes), len(INDEX_BANDS)))
+        for i, (y0, x0, y1, x1) in enumerate(boxes):
+            tile = image_array[y0:y1, x0:x1].astype(np.float32)
+            for j, (a, b) in enumerate(INDEX_BANDS.values()):
+                means[i, j] = np.mean((tile[..., a] - tile[..., b]) / (tile[..., a] + tile[..., b] + 1e-7))
+        return means
+
+    def _full_scan(self, field_id: str, image_array: np.ndarray, detector, reason: str) -> Dict:
+        """Analyze the whole frame and rebuild the field's cache"""
+        results = detector.predict(image_array)
+        boxes = tile_boxes(*image_array.shape[:2], self.tile_size)
+        cache = FieldScanCache(
+            image_array.shape,
+            _gray_thumbnail(image_array, self.signature_stride),
+            tile_signatures(image_array, self.tile_size, self.signature_stride),
+            np.asarray(results["segmentation_mask"], dtype=np.float32),
+            self._index_means(image_array, boxes),
+            {k: results[k] for k in ("nutrients", "yield") if k in results},
+            time.time(),
+            image_array.dtype
+        )
+        self._store(field_id, cache)
+        results["incremental"] = {
+            "mode": "full", "reason": reason, "tiles_total": len(boxes),
+            "tiles_recomputed": len(boxes), "compute_saved_pct": 0.0
+        }
+        results.update(self._tile_stats(cache, boxes))
+        return results
+
+    def _tile_stats(self, cache: FieldScanCache, boxes: List[Tuple[int, int, int, int]]) -> Dict:
+        """Per-tile and area-weighted field stats from a cache"""
+        stats = {"tile_stats": None, "index_means": None}
+        if cache.index_means is None:
+            return stats
+        areas = np.array([(y1 - y0) * (x1 - x0) for y0, x0, y1, x1 in boxes], dtype=float)
+        tile_stats = {name: cache.index_means[:, j] for j, name in enumerate(INDEX_BANDS)}
+        tile_stats["weed_coverage"] = tile_means((cache.mask > 0.5).astype(np.float32), self.tile_size)[:, 0] * 100
+        stats["tile_stats"] = tile_stats
+        stats["index_means"] = {name: float(np.average(tile_stats[name], weights=areas)) for name in INDEX_BANDS}
+        return stats
+
+    def _store(self, field_id: str, cache: FieldScanCache) -> None:
+        self._put_cache(field_id, cache)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache.save(self._cache_path(field_id))
+        except Exception as e:
+            logger.error(f"Error saving scan cache for {field_id}: {e}")
+
+    def analyze(self, field_id: str, image_array: np.ndarray, detector) -> Dict:
+        """
+        Analyze a repeat scan of a field
+
+        Args:
+            field_id: Registered field the frame belongs to
+            image_array: New frame (H, W[, C])
+            detector: Loaded U-Net detector providing predict() and segment_tiles()
+
+        Returns:
+            Detector results for the aligned frame plus "incremental" (tiles recomputed,
+            compute saved, shift), "tile_stats" (per-tile indices and weed coverage) and
+            "index_means" (field NDVI/NDRE/GNDVI); both are None for non-multispectral frames
+        """
+        cache = self._get_cache(field_id)
+        if cache is None:
+            return self._full_scan(field_id, image_array, detector, "first scan")
+        if cache.shape != image_array.shape:
+            return self._full_scan(field_id, image_array, detector, "frame size changed")
+        if cache.dtype is not None and cache.dtype != image_array.dtype:
+            return self._full_scan(field_id, image_array, detector, "pixel type changed")
+
+        start = time.perf_counter()
+        thumbnail = _gray_thumbnail(image_array, self.signature_stride)
+        dy, dx = estimate_shift(cache.thumbnail, thumbnail)
+        if max(abs(dy) / thumbnail.shape[0], abs(dx) / thumbnail.shape[1]) > self.max_shift_fraction:
+            return self._full_scan(field_id, image_array, detector, "frame not aligned with previous scan")
+
+        aligned = align_frame(image_array, dy * self.signature_stride, dx * self.signature_stride)
+        signatures = tile_signatures(aligned, self.tile_size, self.signature_stride)
+        changed = np.abs(signatures - cache.signatures).max(axis=1) > self.change_threshold * _intensity_scale(aligned)
+        boxes = tile_boxes(*aligned.shape[:2], self.tile_size)
+        if changed.mean() > self.full_rerun_fraction:
+            return self._full_scan(field_id, image_array, detector, "most tiles changed")
+
+        changed_boxes = [box for box, is_changed in zip(boxes, changed) if is_changed]
+        mask = cache.mask.astype(np.float32)
+        for (y0, x0, y1, x1), tile_mask in zip(changed_boxes, detector.segment_tiles(aligned, changed_boxes)):
+            mask[y0:y1, x0:x1] = tile_mask
+
+        index_means = cache.index_means
+        if index_means is not None and changed_boxes:
+            index_means = index_means.copy()
+            index_means[changed] = self._index_means(aligned, changed_boxes)
+
+        updated = FieldScanCache(aligned.shape, _gray_thumbnail(aligned, self.signature_stride),
+                                 signatures, mask, index_means, cache.heads, cache.heads_time, aligned.dtype)
+        self._store(field_id, updated)
+
+        results = detector._summarize_mask(mask)
+        # NPK/yield need the full-frame encoder, so they are carried over from the last full scan
+        results.update(cache.heads)
+        saved = 100.0 * (1 - len(changed_boxes) / len(boxes))
+        results["incremental"] = {
+            "mode": "incremental", "tiles_total": len(boxes), "tiles_recomputed": len(changed_boxes),
+            "compute_saved_pct": round(saved, 1), "shift": (dy * self.signature_stride, dx * self.signature_stride),
+            "seconds": round(time.perf_counter() - start, 3),
+            "heads_cached": bool(cache.heads), "heads_time": cache.heads_time
+        }
+        results.update(self._tile_stats(updated, boxes))
+        logger.info(f"Incremental scan of {field_id}: {len(changed_boxes)}/{len(boxes)} tiles recomputed, "
+                    f"{saved:.0f}% U-Net compute saved")
+        return results
@@ -166,6 +166,11 @@ BOT_CONFIG = {
     "max_subscribers": 1000,
     "alert_cooldown": 300,  # 5 minutes between similar alerts
     "default_scan_interval": 15,  # days
+    "scan_jitter": 0.1,  # fraction of the interval scans are randomly spread by
+    "scan_state_file": "scan_schedule.json",
+    "scan_image_dir": "field_scans",  # latest capture per field: <field>.png/.tif
+    "subscriptions_file": "subscriptions.json",  # (field, alert type) -> chat IDs, regions
+    "max_concurrent_analyses": 2,  # image analyses (uploads + scheduled scans) at once
     "supported_languages": ["en", "hi", "ta"],
     "dashboard_base_url": "http://your-dashboard.com"
 }
@@ -180,3 +185,118 @@ MONITORING_THRESHOLDS = {
     "temperature_stress": 35,
     "weed_coverage_alert": 5  # percentage
 }
+
+# AI model configuration
+MODEL_CONFIG = {
+    "unet_model_path": "unet_model.pth",
+    "heads_model_path": "heads_model.pth",
+    # Heads run on the shared U-Net encoder; remove one to skip its cost
+    "enabled_heads": ["segmentation", "npk", "yield"],
+    # Random Forest + Gradient Boosting yield ensemble (see yield_ensemble.py)
+    "yield_ensemble_path": "yield_ensemble.npz",
+    "yield_zone_grid": 4,  # zones per side for per-zone yield
+    "device": "cpu"
+}
+
+# Per-request memory budget and accounting (see memory_budget.py)
+MEMORY_CONFIG = {
+    "request_budget_mb": 1536,  # estimated peak allowed per image analysis
+    "on_exceed": "downscale",  # or "reject"
+    "trace_allocations": False,  # tracemalloc per stage (slows allocations)
+    "soak_mode": False,  # flag RSS growth across requests (or set MEMORY_SOAK=1)
+    "soak_window": 1000,  # requests per soak evaluation
+    "soak_growth_mb": 64  # growth per window reported as a leak
+}
+
+# Incremental analysis of repeat scans (see change_detection.py)
+INCREMENTAL_CONFIG = {
+    "enabled": True,
+    "cache_dir": "scan_cache",  # one cache file per registered field
+    "tile_size": 256,  # pixels; must be a multiple of signature_stride
+    "signature_stride": 4,
+    "change_threshold": 6.0,  # max tile mean/std change (8-bit units, scaled for 16-bit) treated as unchanged
+    "full_rerun_fraction": 0.5  # re-analyze the whole frame when more tiles than this changed
+}
+
+# Pre-filter gate in front of U-Net segmentation (see cascade.py)
+CASCADE_CONFIG = {
+    "enabled": True,
+    "vegetation_threshold": 0.05,  # min share of vegetation pixels to run U-Net
+    "thumbnail_size": 64,  # longest side of the frame the gate inspects
+    "ndvi_vegetation": 0.3,  # multispectral pixel counts as vegetation above this NDVI
+    "exg_vegetation": 0.1  # RGB pixel counts as vegetation above this excess-green index
+}
+
+# Model input buffers (see preprocessing.py)
+PREPROCESS_CONFIG = {
+    "bucket_size": 32,  # pad height/width up to a multiple of this (multiple of 16)
+    "max_buffers_per_bucket": 2,
+    "max_pool_mb": 512,  # idle buffer memory kept for reuse
+    "input_scale": 1.0,  # in-place normalization: x * scale - offset
+    "input_offset": 0.0  # (identity matches how the U-Net weights were trained)
+}
+
+# Per-chat flood protection in front of every handler (see ratelimit.py)
+RATE_LIMIT_CONFIG = {
+    "enabled": True,
+    "limits": {  # category: (tokens refilled per second, burst size)
+        "text": (0.5, 10),
+        "image": (0.1, 3),
+        "admin": (1 / 60, 3)
+    },
+    "admin_commands": ["test_alert", "register_field", "unregister_field", "subscribe_region"],
+    "idle_ttl": 600,  # seconds before an idle chat's buckets are dropped
+    "max_entries": 200000  # hard cap on tracked (chat, category) buckets
+}
+
+# Telegram connection pools (see network.py); BOT_API_BASE_URL env points the bot at a local API
+NETWORK_CONFIG = {
+    "send_pool_size": 16,  # sendMessage / editMessageText / getFile
+    "download_pool_size": 8,  # file downloads, separate keep-alive pool
+    "max_parallel_downloads": 4,
+    "concurrent_updates": 16,  # updates handled at once (downloads overlap with replies)
+    "connect_timeout": 5.0,
+    "read_timeout": 10.0,
+    "write_timeout": 10.0,
+    "pool_timeout": 5.0,
+    "polling_read_timeout": 5.0,  # added to the long-poll timeout by python-telegram-bot
+    "download_timeout": 60.0,
+    "keepalive_expiry": 30.0,  # seconds idle connections stay open
+    "download_chunk_size": 65536,
+    "max_download_mb": 20  # Telegram Bot API download limit
+}
+
+# Structured audit records of queries, analyses and alerts (see audit.py)
+AUDIT_CONFIG = {
+    "enabled": True,
+    "path": "audit/audit.jsonl",
+    "max_queue": 10000,  # records buffered in memory; more are dropped while full
+    "batch_size": 256,
+    "fsync_interval": 5.0,  # seconds
+    "max_mb": 50,  # rotate at this size
+    "backup_count": 10,
+    "compress": True  # gzip rotated files
+}
+
+# Vegetation-masked sparse U-Net inference (see sparse_inference.py)
+SPARSE_CONFIG = {
+    "enabled": True,
+    "tile_size": 128,  # tiles the canopy mask is pooled over (multiple of 16)
+    "min_vegetation": 0.05,  # canopy share a tile needs to be segmented
+    "max_run_fraction": 0.6,  # run dense instead when more tiles than this need segmenting
+    "ndvi_threshold": 0.3,  # canopy: NDVI above this...
+    "gndvi_threshold": 0.2,  # ...and GNDVI above this (multispectral)
+    "exg_threshold": 0.1,  # canopy in RGB photos: chromatic excess green above this
+    "halo": 16,  # context pixels around each tile
+    "batch_size": 8
+}
+
+# Field mosaics stitched from overlapping photos (/mosaic)
+MOSAIC_CONFIG = {
+    "enabled": True,
+    "root": "mosaics",  # one folder of memory-mapped tiles + index.json per field
+    "tile_size": 512,  # canvas tile side; memory use is bounded by max_open_tiles tiles
+    "registration_stride": 4,  # subsampling for phase-correlation registration
+    "search_frames": 3,  # recent frames a new photo is registered against
+    "max_open_tiles": 16
+}
@@ -0,0 +1,300 @@
+"""
+Local fake Telegram Bot API for testing the bot's networking without Telegram
+- getMe / getUpdates (long polling) / sendMessage / editMessageText / deleteMessage / getFile
+- File downloads served from memory under /file/bot<token>/<path>
+- Optional per-call latency and a log of every API call
+- Update backlog (queued but not yet fetched by the bot) for load tests (loadtest.py)
+
+Run the bot against it:
+    python fake_bot_api.py --port 8081 --images field_scans/
+    BOT_API_BASE_URL=http://127.0.0.1:8081 BOT_TOKEN=123:fake python main.py
+
+Check the networking layer end to end:
+    python fake_bot_api.py --check
+"""
+
+import argparse
+import asyncio
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1000001, "is_bot": True, "first_name": "Rice Field AI Monitor", "username": "fake_rice_bot"}
+
+
+class FakeBotAPI:
+    """In-process Bot API server with scripted updates and files"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        """
+        Initialize fake API
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+            latency: Seconds added to every API call and download
+        """
+        self.latency = latency
+        self.files: Dict[str, bytes] = {}
+        self.calls: List[Dict] = []
+        self._updates: List[Dict] = []
+        self._update_ids = itertools.count(1)
+        self.last_delivered = 0
+        self.polling = threading.Event()
+        self._message_ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBotAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Bot API listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Scripting
+
+    def add_file(self, file_id: str, data: bytes) -> None:
+        self.files[file_id] = data
+
+    def push_update(self, update: Dict) -> int:
+        """Queue a raw update for getUpdates; returns its update_id"""
+        with self._cond:
+            update = dict(update, update_id=next(self._update_ids))
+            self._updates.append(update)
+            self._cond.notify_all()
+        return update["update_id"]
+
+    def _message(self, chat_id: int, **fields) -> Dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"Farmer {chat_id}"},
+            **fields,
+        }
+
+    def text_update(self, chat_id: int, text: str) -> int:
+        """Queue a text message (or /command) from a chat"""
+        message = self._message(chat_id, text=text)
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return self.push_update({"message": message})
+
+    def photo_update(self, chat_id: int, file_id: str, caption: Optional[str] = None,
+                     width: int = 1280, height: int = 960) -> int:
+        """Queue a photo message whose largest size is a registered file"""
+        photo = [{"file_id": file_id, "file_unique_id": f"u{file_id}", "width": width,
+                  "height": height, "file_size": len(self.files.get(file_id, b""))}]
+        fields = {"photo": photo}
+        if caption:
+            fields["caption"] = caption
+        return self.push_update({"message": self._message(chat_id, **fields)})
+
+    def backlog(self) -> int:
+        """Updates queued that the bot has not fetched yet"""
+        with self._cond:
+            return sum(1 for u in self._updates if u["update_id"] > self.last_delivered)
+
+    def sent_messages(self, chat_id: Optional[int] = None) -> List[Dict]:
+        return [call for call in self.calls if call["method"] == "sendMessage"
+                and (chat_id is None or call["params"].get("chat_id") == chat_id)]
+
+    # Bot API methods
+
+    def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + timeout
+        self.polling.set()
+        with self._cond:
+            # Confirm updates below the offset, as Telegram does
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            updates = self._updates[:limit]
+            if updates:
+                self.last_delivered = max(self.last_delivered, updates[-1]["update_id"])
+            return updates
+
+    def _call(self, method: str, params: Dict):
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return self._get_updates(params)
+        if method in ("sendMessage", "editMessageText"):
+            message = self._message(int(params["chat_id"]), text=params.get("text", ""))
+            message["from"] = BOT_USER
+            if method == "editMessageText":
+                message["message_id"] = int(params["message_id"])
+            return message
+        if method == "getFile":
+            file_id = params["file_id"]
+            if file_id not in self.files:
+                raise KeyError(f"Bad Request: invalid file_id {file_id}")
+            return {"file_id": file_id, "file_unique_id": f"u{file_id}",
+                    "file_size": len(self.files[file_id]), "file_path": f"photos/{file_id}.jpg"}
+        # deleteWebhook, deleteMessage, setMyCommands, sendChatAction, ...
+        return True
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like api.telegram.org
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client went away (e.g. the bot shut down mid long poll)
+                    pass
+
+            def _params(self) -> Dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    return json.loads(body or "{}")
+                params = {}
+                for key, value in parse_qsl(urlparse(self.path).query) + parse_qsl(body):
+                    try:
+                        params[key] = json.loads(value)
+                    except ValueError:
+                        params[key] = value
+                return params
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path.startswith("/file/bot"):
+                    if api.latency:
+                        time.sleep(api.latency)
+                    file_id = os.path.splitext(os.path.basename(path))[0]
+                    data = api.files.get(file_id)
+                    if data is None:
+                        self._send(404, b"Not Found", "text/plain")
+                    else:
+                        self._send(200, data, "image/jpeg")
+                    return
+                self.do_POST()
+
+            def do_POST(self):
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if len(parts) != 2 or not parts[0].startswith("bot"):
+                    self._send(404, b'{"ok": false, "error_code": 404, "description": "Not Found"}')
+                    return
+                method, params = parts[1], self._params()
+                started = time.time()
+                if api.latency and method != "getUpdates":
+                    time.sleep(api.latency)
+                try:
+                    result = api._call(method, params)
+                    body = {"ok": True, "result": result}
+                    status = 200
+                except Exception as e:
+                    body = {"ok": False, "error_code": 400, "description": str(e)}
+                    status = 400
+                if method != "getUpdates":
+                    api.calls.append({"method": method, "params": params, "time": started,
+                                      "duration": time.time() - started})
+                self._send(status, json.dumps(body).encode())
+
+        return Handler
+
+
+async def check_networking(api: FakeBotAPI, downloads: int = 16, file_size: int = 2 * 1024 * 1024) -> Dict:
+    """Resolve, download and acknowledge files in parallel through network.py's pools"""
+    from telegram import Bot
+    from config import NETWORK_CONFIG
+    from network import FileDownloader, build_send_request, api_urls
+
+    payload = os.urandom(file_size)
+    for i in range(downloads):
+        api.add_file(f"check{i}", payload)
+
+    bot = Bot("123:fake", request=build_send_request(NETWORK_CONFIG), **api_urls(api.base_url))
+    downloader = FileDownloader(pool_size=NETWORK_CONFIG["download_pool_size"],
+                                max_parallel=NETWORK_CONFIG["max_parallel_downloads"])
+    async with bot:
+        me = await bot.get_me()
+
+        async def one(i: int) -> bool:
+            data = await downloader.download(bot, f"check{i}")
+            await bot.send_message(chat_id=i, text=f"received {len(data.getvalue())} bytes")
+            return data.getvalue() == payload
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(downloads)))
+        elapsed = time.perf_counter() - start
+    await downloader.close()
+    return {
+        "bot": me.username,
+        "downloads": downloads,
+        "intact": all(results),
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(downloads * file_size / 1e6 / elapsed, 1),
+        "messages_sent": len(api.sent_messages()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--images", help="directory of images served by file_id (file name stem)")
+    parser.add_argument("--check", action="store_true", help="run a parallel download/send check and exit")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    api = FakeBotAPI(args.host, 0 if args.check else args.port, args.latency)
+    if args.images:
+        for path in glob.glob(os.path.join(args.images, "*")):
+            with open(path, "rb") as f:
+                api.add_file(os.path.splitext(os.path.basename(path))[0], f.read())
+    api.start()
+
+    if args.check:
+        try:
+            print(asyncio.run(check_networking(api)))
+        finally:
+            api.stop()
+        return
+
+    print(f"Fake Bot API on {api.base_url} with {len(api.files)} files; Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,549 @@
+"""
+Trace-replay load testing against the local fake Bot API
+- Runs the real main.py against fake_bot_api.py and replays an update trace
+  (text, photos, commands) at a configurable speed-up
+- Traces are synthesized (morning upload burst, alert fan-out colliding with
+  queries) or converted from the audit log
+- Measures end-to-end reply latency, update backlog, dropped updates and the
+  bot's CPU/RSS over time
+- Compares run reports and flags capacity regressions
+
+    python loadtest.py synth -o traces/morning.jsonl --minutes 30 --chats 200
+    python loadtest.py from-audit audit/audit.jsonl -o traces/recorded.jsonl
+    python loadtest.py run traces/morning.jsonl --speedup 20 -o reports/baseline.json
+    python loadtest.py compare reports/baseline.json reports/candidate.json -o reports/compare.md
+"""
+
+import argparse
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from config import MODEL_CONFIG, SAMPLE_ALERTS
+from fake_bot_api import FakeBotAPI
+from sparse_inference import synthetic_paddy
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUERIES = [
+    "Any weed alerts in my field?", "How is my crop health?", "What is the yield prediction?",
+    "Which fertilizer should I apply?", "What does NDVI mean?", "When should I irrigate?",
+    "Is there any disease risk?", "What is the weather outlook?", "Crop is at tillering stage, what now?",
+    "What actions should I take?",
+]
+
+# Sent twice per photo: the "Processing..." notice, then the report (or an edit on error)
+PHOTO_ACK_PREFIX = "📸 **Processing"
+PHOTO_REPORT_MARKERS = ("ANALYSIS COMPLETE", "NO CROP DETECTED")
+RATE_LIMIT_PREFIX = "⏳"
+
+
+# Traces: one JSON object per line, {"t": seconds, "chat_id": int, "kind": "text" | "command" | "photo",
+# "text": str (text/command/caption), "image": "WxH" (photo)}
+
+def save_trace(events: List[Dict], path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def load_trace(path: str) -> List[Dict]:
+    with open(path, 'r') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return sorted(events, key=lambda event: event["t"])
+
+
+def synthesize_trace(minutes: float = 30, chats: int = 200, queries_per_chat: float = 3,
+                     photos_per_chat: float = 1, alerts: int = 3, burst_center: float = 0.35,
+                     burst_width: float = 0.1, image_size: str = "1280x960", seed: int = 0) -> List[Dict]:
+    """
+    Peak-hour trace: chats subscribe, ask questions throughout, upload photos in a
+    morning burst, and an admin fans alerts out to every subscriber mid-burst
+
+    Args:
+        minutes: Trace length in trace time (replay divides by the speed-up)
+        chats: Farmer chats (IDs 1001...); chat 1 is the admin sending /test_alert
+        queries_per_chat: Mean text questions per chat, spread over the whole trace
+        photos_per_chat: Mean photo uploads per chat, concentrated in the burst
+        alerts: /test_alert commands sent during the burst
+        burst_center: Peak of the upload burst as a fraction of the trace
+        burst_width: Standard deviation of upload times as a fraction of the trace
+        image_size: Photo size as "WxH"
+        seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    duration = minutes * 60
+    chat_ids = np.arange(1001, 1001 + chats)
+    events = [{"t": float(t), "chat_id": int(chat_id), "kind": "command", "text": "/subscribe"}
+              for chat_id, t in zip(chat_ids, rng.uniform(0, 0.05 * duration, chats))]
+
+    n_queries = rng.poisson(queries_per_chat * chats)
+    for chat_id, t in zip(rng.choice(chat_ids, n_queries), rng.uniform(0.05 * duration, duration, n_queries)):
+        events.append({"t": float(t), "chat_id": int(chat_id), "kind": "text", "text": str(rng.choice(QUERIES))})
+
+    n_photos = rng.poisson(photos_per_chat * chats)
+    times = np.clip(rng.normal(burst_center * duration, burst_width * duration, n_photos), 0, duration)
+    for chat_id, t in zip(rng.choice(chat_ids, n_photos), times):
+        events.append({"t": float(t), "chat_id": int(chat_id), "kind": "photo", "image": image_size})
+
+    for t in np.linspace(burst_center - burst_width, burst_center + burst_width, alerts) * duration:
+        events.append({"t": float(t), "chat_id": 1, "kind": "command", "text": "/test_alert weed"})
+    return sorted(events, key=lambda event: event["t"])
+
+
+def trace_from_audit(paths: List[str]) -> List[Dict]:
+    """Replayable trace from audit log files (.jsonl or rotated .gz): queries and photo uploads"""
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records = [r for r in records if r.get("type") in ("query", "image_analysis") and r.get("chat_id")]
+    if not records:
+        return []
+    start = min(r["ts"] for r in records)
+
+    events = []
+    for record in sorted(records, key=lambda r: r["ts"]):
+        event = {"t": round(record["ts"] - start, 3), "chat_id": record["chat_id"]}
+        if record["type"] == "query":
+            event.update(kind="text", text=record["text"])
+        else:
+            results = record.get("results") or {}
+            # Older logs spread the results into the record itself
+            image_size = results.get("image_size") or record.get("image_size")
+            event.update(kind="photo", image=image_size or "1280x960")
+            if record.get("field_id"):
+                event["text"] = record["field_id"]
+        events.append(event)
+    return events
+
+
+def latency_stats(values: List[float]) -> Dict:
+    """Percentiles in milliseconds"""
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "mean": round(float(ms.mean()), 1),
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p95": round(float(np.percentile(ms, 95)), 1),
+        "p99": round(float(np.percentile(ms, 99)), 1),
+        "max": round(float(ms.max()), 1),
+    }
+
+
+class ProcessSampler:
+    """CPU and RSS of another process from procfs"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page = os.sysconf("SC_PAGE_SIZE")
+        self._last = None
+
+    def sample(self) -> Dict:
+        try:
+            with open(f"/proc/{self.pid}/stat", 'r') as f:
+                # Fields after the command name, which may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/statm", 'r') as f:
+                rss = int(f.read().split()[1]) * self._page
+        except (OSError, IndexError):
+            return {}
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._ticks
+        now = time.monotonic()
+        cpu_pct = None
+        if self._last is not None:
+            cpu_pct = round(100 * (cpu_seconds - self._last[1]) / max(now - self._last[0], 1e-6), 1)
+        self._last = (now, cpu_seconds)
+        return {"cpu_pct": cpu_pct, "rss_mb": round(rss / 1024 / 1024, 1), "threads": int(fields[17])}
+
+
+class LoadTest:
+    """Replays a trace against main.py running on a fake Bot API and records what the chats see"""
+
+    def __init__(self, events: List[Dict], speedup: float = 1.0, api_latency: float = 0.0,
+                 drain_timeout: float = 60.0, sample_interval: float = 0.5, startup_timeout: float = 120.0,
+                 workdir: Optional[str] = None, env: Optional[Dict[str, str]] = None):
+        """
+        Initialize load test
+
+        Args:
+            events: Trace events (see synthesize_trace)
+            speedup: Trace time divided by this (10 replays a 10 minute trace in 1 minute)
+            api_latency: Seconds the fake API adds to every call and download
+            drain_timeout: Seconds to wait for outstanding replies after the last update
+            sample_interval: Seconds between backlog/CPU/RSS samples
+            startup_timeout: Seconds to wait for the bot to start polling
+            workdir: Bot working directory for its state files (fresh temporary directory by default)
+            env: Extra environment variables for the bot process
+        """
+        self.events = sorted(events, key=lambda event: event["t"])
+        self.speedup = speedup
+        self.api_latency = api_latency
+        self.drain_timeout = drain_timeout
+        self.sample_interval = sample_interval
+        self.startup_timeout = startup_timeout
+        self.workdir = workdir
+        self.env = env or {}
+
+        self._pending: Dict[int, Dict] = {}
+        # Per chat, update IDs waiting for a reply, in arrival order: replies to text and
+        # commands, and photo notices/reports, are matched separately
+        self._waiting = defaultdict(lambda: {"text": deque(), "ack": deque(), "photo": deque()})
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.photo_ack_latencies: List[float] = []
+        self.answered = 0
+        self.rate_limited = 0
+        self.alerts_delivered = 0
+        self.unmatched_replies = 0
+        self.samples: List[Dict] = []
+        self._clock_offset = time.time() - time.monotonic()
+
+    # Replay
+
+    def _image(self, api: FakeBotAPI, size: str) -> str:
+        """File ID of a synthetic paddy photo of the given size, registered with the API once"""
+        file_id = f"paddy_{size}"
+        if file_id not in api.files:
+            width, height = (int(value) for value in size.lower().split("x"))
+            scene = synthetic_paddy(max(width, height))[:height, :width, [2, 1, 0]]
+            buffer = io.BytesIO()
+            Image.fromarray(np.ascontiguousarray(scene)).save(buffer, "JPEG", quality=90)
+            api.add_file(file_id, buffer.getvalue())
+        return file_id
+
+    def _push(self, api: FakeBotAPI, event: Dict) -> None:
+        chat_id, kind = event["chat_id"], event["kind"]
+        with self._lock:
+            if kind == "photo":
+                width, height = (int(value) for value in event["image"].lower().split("x"))
+                update_id = api.photo_update(chat_id, self._image(api, event["image"]), event.get("text"),
+                                             width=width, height=height)
+                group = "photo"
+                self._waiting[chat_id]["ack"].append(update_id)
+            else:
+                update_id = api.text_update(chat_id, event["text"])
+                group = event["text"].split()[0] if kind == "command" else "text"
+            self._waiting[chat_id]["photo" if kind == "photo" else "text"].append(update_id)
+            self._pending[update_id] = {"group": group, "pushed": time.monotonic()}
+
+    def _answer(self, update_id: int, at: float) -> None:
+        request = self._pending.pop(update_id, None)
+        if request is not None:
+            self.latencies[request["group"]].append(at - request["pushed"])
+            self.answered += 1
+
+    def _match(self, call: Dict) -> None:
+        """Attribute one outgoing API call to the update it answers"""
+        method, params = call["method"], call["params"]
+        if method not in ("sendMessage", "editMessageText"):
+            return
+        chat_id = int(params.get("chat_id", 0))
+        text = params.get("text", "")
+        # Server-side start of the call (wall clock) on the harness's monotonic clock
+        at = call["time"] - self._clock_offset
+        waiting = self._waiting[chat_id]
+        if method == "sendMessage" and text.startswith(RATE_LIMIT_PREFIX):
+            # The refused update (most likely the chat's newest) is dropped by the bot and stays unanswered
+            self.rate_limited += 1
+            newest = max((queue for queue in (waiting["text"], waiting["photo"]) if queue),
+                          key=lambda queue: queue[-1], default=None)
+            if newest is not None:
+                newest.pop()
+        elif method == "sendMessage" and text in SAMPLE_ALERTS.values():
+            self.alerts_delivered += 1
+        elif method == "sendMessage" and text.startswith(PHOTO_ACK_PREFIX) and waiting["ack"]:
+            update_id = waiting["ack"].popleft()
+            if update_id in self._pending:
+                self.photo_ack_latencies.append(at - self._pending[update_id]["pushed"])
+        elif (method == "editMessageText" or any(marker in text for marker in PHOTO_REPORT_MARKERS)) \
+                and waiting["photo"]:
+            self._answer(waiting["photo"].popleft(), at)
+        elif method == "sendMessage" and waiting["text"]:
+            self._answer(waiting["text"].popleft(), at)
+        else:
+            self.unmatched_replies += 1
+
+    def _sample(self, api: FakeBotAPI, sampler: ProcessSampler, start: float) -> None:
+        sample = {"t": round(time.monotonic() - start, 2), "backlog": api.backlog()}
+        with self._lock:
+            delivered = sum(1 for update_id in self._pending if update_id <= api.last_delivered)
+        sample["in_flight"] = delivered
+        sample["answered"] = self.answered
+        sample.update(sampler.sample())
+        self.samples.append(sample)
+
+    def _start_bot(self, api: FakeBotAPI, workdir: str):
+        # Reuse trained models from the repo when present
+        for key in ("unet_model_path", "heads_model_path", "yield_ensemble_path"):
+            source = os.path.join(REPO_DIR, MODEL_CONFIG[key])
+            target = os.path.join(workdir, MODEL_CONFIG[key])
+            if os.path.exists(source) and not os.path.exists(target):
+                os.symlink(source, target)
+        env = dict(os.environ, BOT_API_BASE_URL=api.base_url, BOT_TOKEN="123:loadtest",
+                   PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+                   **self.env)
+        log = open(os.path.join(workdir, "bot.log"), 'w')
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "main.py")], cwd=workdir,
+                                   env=env, stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        return process
+
+    def run(self) -> Dict:
+        """Start the fake API and the bot, replay the trace, drain and stop; returns the report"""
+        workdir = self.workdir or tempfile.mkdtemp(prefix="loadtest-")
+        os.makedirs(workdir, exist_ok=True)
+        api = FakeBotAPI(latency=self.api_latency).start()
+        for event in self.events:
+            if event["kind"] == "photo":
+                self._image(api, event["image"])
+        process = self._start_bot(api, workdir)
+        sampler = ProcessSampler(process.pid)
+        try:
+            if not api.polling.wait(self.startup_timeout) or process.poll() is not None:
+                raise RuntimeError(f"Bot did not start polling; see {os.path.join(workdir, 'bot.log')}")
+            start = time.monotonic()
+            next_sample = start
+            seen_calls = len(api.calls)
+            events = deque(self.events)
+            last_progress = None
+
+            while True:
+                now = time.monotonic()
+                while events and start + events[0]["t"] / self.speedup <= now:
+                    self._push(api, events.popleft())
+                # Calls are appended by the API's handler threads; read up to a snapshot length
+                calls = len(api.calls)
+                with self._lock:
+                    for call in api.calls[seen_calls:calls]:
+                        self._match(call)
+                if calls > seen_calls or events:
+                    last_progress = now
+                seen_calls = calls
+                if now >= next_sample:
+                    self._sample(api, sampler, start)
+                    next_sample += self.sample_interval
+                if not events and (not self._pending or now - last_progress > self.drain_timeout):
+                    break
+                if process.poll() is not None:
+                    logger.error("Bot exited with code %s during the run", process.returncode)
+                    break
+                time.sleep(0.01)
+            elapsed = time.monotonic() - start
+            # Up to the last reply: waiting out drain_timeout for dropped updates is not work
+            busy = last_progress - start if last_progress is not None else elapsed
+            self._sample(api, sampler, start)
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            api.stop()
+        return self.report(elapsed, workdir, busy)
+
+    def report(self, elapsed: float, workdir: str, busy: Optional[float] = None) -> Dict:
+        """Run report; throughput is measured over busy seconds (the whole run by default)"""
+        busy = elapsed if busy is None else busy
+        updates = len(self.events)
+        cpu = [s["cpu_pct"] for s in self.samples if s.get("cpu_pct") is not None]
+        rss = [s["rss_mb"] for s in self.samples if "rss_mb" in s]
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        return {
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "git_commit": git_commit(),
+            "speedup": self.speedup,
+            "api_latency": self.api_latency,
+            "workdir": workdir,
+            "summary": {
+                "updates": updates,
+                "answered": self.answered,
+                "dropped": len(self._pending),
+                "dropped_pct": round(100 * len(self._pending) / updates, 2) if updates else 0.0,
+                "rate_limited": self.rate_limited,
+                "alerts_delivered": self.alerts_delivered,
+                "unmatched_replies": self.unmatched_replies,
+                "seconds": round(elapsed, 2),
+                "busy_seconds": round(busy, 2),
+                "throughput_per_s": round(self.answered / busy, 2) if busy > 0 else 0.0,
+                "latency_ms": latency_stats(all_latencies),
+                "photo_ack_ms": latency_stats(self.photo_ack_latencies),
+                "backlog_max": max((s["backlog"] for s in self.samples), default=0),
+                "in_flight_max": max((s["in_flight"] for s in self.samples), default=0),
+                "cpu_mean_pct": round(float(np.mean(cpu)), 1) if cpu else None,
+                "cpu_max_pct": max(cpu, default=None),
+                "rss_max_mb": max(rss, default=None),
+                "rss_growth_mb": round(rss[-1] - rss[0], 1) if rss else None,
+            },
+            "latency_ms_by_type": {group: latency_stats(values) for group, values in sorted(self.latencies.items())},
+            "dropped_by_type": dict(Counter(request["group"] for request in self._pending.values())),
+            "samples": self.samples,
+        }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# Comparison: (summary key path, higher is better, relative tolerance before flagging)
+COMPARED_METRICS = [
+    ("latency_ms.p50", False, 0.2),
+    ("latency_ms.p95", False, 0.2),
+    ("latency_ms.p99", False, 0.25),
+    ("photo_ack_ms.p95", False, 0.25),
+    ("throughput_per_s", True, 0.1),
+    ("dropped", False, 0.0),
+    ("backlog_max", False, 0.25),
+    ("in_flight_max", False, 0.25),
+    ("cpu_mean_pct", False, 0.2),
+    ("rss_max_mb", False, 0.15),
+    ("rss_growth_mb", False, 0.5),
+]
+
+
+def _metric(summary: Dict, path: str):
+    value = summary
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare_reports(reports: List[Dict], names: List[str]) -> Dict:
+    """
+    Compare runs against the first (baseline)
+
+    Returns:
+        dict with a markdown table and the regressions found (metric, run, baseline, value)
+    """
+    baseline = reports[0]["summary"]
+    header = "| Metric | " + " | ".join(names) + " |"
+    lines = [header, "|" + " --- |" * (len(names) + 1)]
+    regressions = []
+    for path, higher_is_better, tolerance in COMPARED_METRICS:
+        base = _metric(baseline, path)
+        cells = ["-" if base is None else f"{base:g}"]
+        for name, report in zip(names[1:], reports[1:]):
+            value = _metric(report["summary"], path)
+            if value is None or base is None:
+                cells.append("-" if value is None else f"{value:g}")
+                continue
+            change = (value - base) / abs(base) if base else (0.0 if value == base else float("inf"))
+            worse = -change if higher_is_better else change
+            flag = ""
+            # Small absolute differences are noise (e.g. 2 ms on 10 ms, or 0 -> 1 in backlog)
+            if worse > tolerance and abs(value - base) > (0 if path == "dropped" else 1):
+                flag = " ❌"
+                regressions.append({"metric": path, "run": name, "baseline": base, "value": value})
+            change_text = f"{change:+.0%}" if np.isfinite(change) else "new"
+            cells.append(f"{value:g} ({change_text}){flag}")
+        lines.append(f"| {path} | " + " | ".join(cells) + " |")
+
+    summary = (f"{len(regressions)} regression(s) against {names[0]}" if regressions
+               else f"No regressions against {names[0]}")
+    runs = "\n".join(f"- **{name}**: commit {report.get('git_commit') or '?'}, {report['summary']['updates']} "
+                     f"updates at {report['speedup']:g}x, API latency {report['api_latency']:g}s"
+                     for name, report in zip(names, reports))
+    markdown = f"# Load test comparison\n\n{runs}\n\n{chr(10).join(lines)}\n\n**{summary}**\n"
+    return {"markdown": markdown, "regressions": regressions}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    synth = commands.add_parser("synth", help="synthesize a peak-hour trace")
+    synth.add_argument("-o", "--output", required=True)
+    synth.add_argument("--minutes", type=float, default=30)
+    synth.add_argument("--chats", type=int, default=200)
+    synth.add_argument("--queries-per-chat", type=float, default=3)
+    synth.add_argument("--photos-per-chat", type=float, default=1)
+    synth.add_argument("--alerts", type=int, default=3)
+    synth.add_argument("--image-size", default="1280x960")
+    synth.add_argument("--seed", type=int, default=0)
+
+    from_audit = commands.add_parser("from-audit", help="convert audit logs into a trace")
+    from_audit.add_argument("paths", nargs="+", help="audit.jsonl files or globs (rotated .gz supported)")
+    from_audit.add_argument("-o", "--output", required=True)
+
+    run = commands.add_parser("run", help="replay a trace against main.py and write a report")
+    run.add_argument("trace")
+    run.add_argument("-o", "--output", required=True)
+    run.add_argument("--speedup", type=float, default=1.0)
+    run.add_argument("--api-latency", type=float, default=0.0, help="seconds added to every API call")
+    run.add_argument("--drain-timeout", type=float, default=60.0)
+    run.add_argument("--sample-interval", type=float, default=0.5)
+    run.add_argument("--workdir", help="bot working directory (temporary by default)")
+
+    compare = commands.add_parser("compare", help="compare run reports against the first; exit 1 on regressions")
+    compare.add_argument("reports", nargs="+")
+    compare.add_argument("-o", "--output", help="write the markdown comparison here")
+
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    if args.command == "synth":
+        events = synthesize_trace(args.minutes, args.chats, args.queries_per_chat, args.photos_per_chat,
+                                  args.alerts, image_size=args.image_size, seed=args.seed)
+        save_trace(events, args.output)
+        print(f"{len(events)} events over {args.minutes:g} minutes written to {args.output}")
+    elif args.command == "from-audit":
+        paths = sorted(path for pattern in args.paths for path in glob.glob(pattern))
+        events = trace_from_audit(paths)
+        save_trace(events, args.output)
+        print(f"{len(events)} events from {len(paths)} audit file(s) written to {args.output}")
+    elif args.command == "run":
+        test = LoadTest(load_trace(args.trace), speedup=args.speedup, api_latency=args.api_latency,
+                        drain_timeout=args.drain_timeout, sample_interval=args.sample_interval,
+                        workdir=args.workdir)
+        report = test.run()
+        report["trace"] = args.trace
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(json.dumps(report["summary"], indent=1))
+        print(f"Report written to {args.output}")
+    else:
+        reports = []
+        for path in args.reports:
+            with open(path, 'r') as f:
+                reports.append(json.load(f))
+        names = [os.path.splitext(os.path.basename(path))[0] for path in args.reports]
+        result = compare_reports(reports, names)
+        print(result["markdown"])
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(result["markdown"])
+        sys.exit(1 if result["regressions"] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Per-request memory budgeting
+- Peak estimate from image dimensions before decoding, with downscale or reject
+- Per-stage timings for each request, with process-level RSS / tracemalloc
+  readings (shared by concurrent requests, so flagged when stages overlap)
+- Opt-in soak mode that flags RSS growth across many requests
+"""
+
+import asyncio
+import contextvars
+import ctypes
+import ctypes.util
+import logging
+import math
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Peak bytes per pixel of each pipeline stage (U-Net figure measured with
+# torch.no_grad() on CPU: ~2.0-2.5 KB/px from 512x512 down to 256x256)
+UNET_BYTES_PER_PIXEL = 2048
+TENSOR_BYTES_PER_PIXEL = 5 * 4  # float32 5-channel input written into a pooled buffer
+INDEX_BYTES_PER_PIXEL = 10 * 8  # float64 band copies, index maps and temporaries
+
+MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when a request's estimated peak memory exceeds the budget"""
+
+
+def estimate_peak_bytes(width: int, height: int, channels: int) -> int:
+    """Estimate a request's peak memory from image dimensions alone"""
+    pixels = width * height
+    decoded = pixels * channels * 2  # PIL image plus NumPy view of its bytes
+    return decoded + pixels * (TENSOR_BYTES_PER_PIXEL + INDEX_BYTES_PER_PIXEL + UNET_BYTES_PER_PIXEL)
+
+
+def current_rss() -> int:
+    """Current resident set size in bytes"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # No procfs: fall back to the high-water mark
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def peak_rss() -> int:
+    """Process RSS high-water mark in bytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_libc_path = ctypes.util.find_library("c")
+_malloc_trim = getattr(ctypes.CDLL(_libc_path), "malloc_trim", None) if _libc_path else None
+
+def release_memory() -> None:
+    """Return freed heap pages to the OS (glibc only; no-op elsewhere)"""
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+# Stages running anywhere in the process; RSS, ru_maxrss and the tracemalloc peak are
+# process-wide, so a stage's readings include whatever overlapped with it
+_stage_lock = threading.Lock()
+_active_stages = 0
+_stages_started = 0
+
+
+def _enter_stage():
+    """Register a starting stage; returns (stages already active, start sequence number)"""
+    global _active_stages, _stages_started
+    with _stage_lock:
+        active = _active_stages
+        _active_stages += 1
+        _stages_started += 1
+        # Only reset the shared peak when no other stage is being measured
+        if active == 0 and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        return active, _stages_started
+
+
+def _exit_stage(sequence: int) -> bool:
+    """Unregister a stage; returns whether another stage ran during it"""
+    global _active_stages
+    with _stage_lock:
+        _active_stages -= 1
+        return _stages_started != sequence
+
+
+class RequestMemory:
+    """Memory usage of one request, recorded per stage"""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.estimated_bytes = 0
+        self.scale = 1.0
+        self.stages: Dict[str, Dict] = {}
+        # Model input buffers taken (allocated or reused from the pool) and bytes written into them
+        self.input_buffers = {"allocations": 0, "reuses": 0, "bytes_copied": 0}
+        self.start_rss = current_rss()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Record a stage's time plus process RSS growth, high-water mark growth and traced peak
+
+        The memory readings are process-level. When another stage overlapped (concurrent
+        requests) the record has "overlapped": True and the readings include its allocations.
+        """
+        tracing = tracemalloc.is_tracing()
+        active, sequence = _enter_stage()
+        if tracing:
+            traced_start = tracemalloc.get_traced_memory()[0]
+        rss_start = current_rss()
+        peak_start = peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            overlapped = _exit_stage(sequence) or active > 0
+            record = {
+                "seconds": round(time.perf_counter() - start, 4),
+                "process_rss_delta_mb": round((current_rss() - rss_start) / MB, 2),
+                "process_peak_rss_growth_mb": round((peak_rss() - peak_start) / MB, 2),
+                "overlapped": overlapped,
+            }
+            if tracing:
+                record["process_traced_peak_mb"] = round(
+                    (tracemalloc.get_traced_memory()[1] - traced_start) / MB, 2)
+            self.stages[name] = record
+
+    def summary(self) -> Dict:
+        return {
+            "estimated_mb": round(self.estimated_bytes / MB, 1),
+            "scale": round(self.scale, 3),
+            "stages": self.stages,
+            "input_buffers": self.input_buffers,
+            "process_rss_growth_mb": round((current_rss() - self.start_rss) / MB, 2),
+        }
+
+
+_current_request: contextvars.ContextVar = contextvars.ContextVar("current_request", default=None)
+
+def record_input(allocated: Optional[bool] = None, bytes_copied: int = 0) -> None:
+    """Count a model input buffer (allocated=True/False for new/reused) or bytes written into one on the current request"""
+    usage = _current_request.get()
+    if usage is None:
+        return
+    if allocated is not None:
+        usage.input_buffers["allocations" if allocated else "reuses"] += 1
+    usage.input_buffers["bytes_copied"] += bytes_copied
+
+
+@contextmanager
+def stage(name: str):
+    """Record a stage on the current request, if any (context propagates into asyncio.to_thread)"""
+    usage = _current_request.get()
+    if usage is None:
+        yield
+        return
+    with usage.stage(name):
+        yield
+
+
+class LeakDetector:
+    """Flags steady RSS growth over a sliding window of requests"""
+
+    def __init__(self, window: int = 1000, growth_threshold_mb: float = 64):
+        self.window = window
+        self.growth_threshold_mb = growth_threshold_mb
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+
+    def record(self, rss_bytes: int) -> Optional[float]:
+        """
+        Add an after-request RSS sample
+
+        Returns:
+            Fitted growth in MB across the window when it exceeds the threshold, else None
+        """
+        self.samples.append(rss_bytes / MB)
+        self.requests += 1
+        # Evaluate once per full window
+        if len(self.samples) < self.window or self.requests % self.window:
+            return None
+
+        slope = np.polyfit(np.arange(self.window), np.asarray(self.samples), 1)[0]
+        growth = slope * self.window
+        if growth > self.growth_threshold_mb:
+            logger.warning(f"Memory soak: RSS grew {growth:.1f} MB over the last {self.window} "
+                           f"requests ({self.requests} total, now {self.samples[-1]:.0f} MB)")
+            return growth
+        return None
+
+
+class MemoryGuard:
+    """Budgets, accounts and soak-tests memory for image analysis requests"""
+
+    def __init__(self, budget_mb: float = 1536, on_exceed: str = "downscale",
+                 trace_allocations: bool = False, soak_mode: bool = False,
+                 soak_window: int = 1000, soak_growth_mb: float = 64):
+        """
+        Initialize memory guard
+
+        Args:
+            budget_mb: Maximum estimated peak memory per request
+            on_exceed: "downscale" to shrink oversized images, "reject" to refuse them
+            trace_allocations: Enable tracemalloc for per-stage Python/NumPy peaks
+            soak_mode: Track RSS after every request and flag sustained growth
+            soak_window: Requests per soak evaluation window
+            soak_growth_mb: RSS growth per window that is reported as a leak
+        """
+        if on_exceed not in ("downscale", "reject"):
+            raise ValueError(f"on_exceed must be 'downscale' or 'reject', got {on_exceed!r}")
+        self.budget_bytes = int(budget_mb * MB)
+        self.on_exceed = on_exceed
+        self.leak_detector = LeakDetector(soak_window, soak_growth_mb) if soak_mode else None
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @asynccontextmanager
+    async def request(self, request_id: str):
+        """Track memory for one request (``async with``); stages inside use ``stage(name)``"""
+        usage = RequestMemory(request_id)
+        token = _current_request.set(usage)
+        try:
+            yield usage
+        finally:
+            _current_request.reset(token)
+            # malloc_trim walks the whole heap; keep it off the event loop
+            await asyncio.to_thread(release_memory)
+            logger.info(f"Memory for {request_id}: {usage.summary()}")
+            if self.leak_detector is not None:
+                self.leak_detector.record(current_rss())
+
+    def fit_to_budget(self, image, usage: Optional[RequestMemory] = None):
+        """
+        Check an opened (not yet decoded) PIL image against the budget
+
+        Returns:
+            The image, downscaled when it would exceed the budget
+
+        Raises:
+            MemoryBudgetExceeded: When over budget and on_exceed is "reject"
+        """
+        width, height = image.size
+        channels = len(image.getbands())
+        estimate = estimate_peak_bytes(width, height, channels)
+        if usage is not None:
+            usage.estimated_bytes = estimate
+        if estimate <= self.budget_bytes:
+            return image
+
+        if self.on_exceed == "reject":
+            raise MemoryBudgetExceeded(
+                f"image {width}x{height} needs ~{estimate / MB:.0f} MB, "
+                f"budget is {self.budget_bytes / MB:.0f} MB"
+            )
+
+        # Peak scales with pixel count, so shrink each side by the square root
+        scale = math.sqrt(self.budget_bytes / estimate)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        # JPEG decodes directly at a reduced size, avoiding the full-size bitmap
+        image.draft(image.mode, size)
+        image = image.resize(size)
+        if usage is not None:
+            usage.scale = scale
+            usage.estimated_bytes = estimate_peak_bytes(size[0], size[1], channels)
+        logger.info(f"Downscaled {width}x{height} image to {size[0]}x{size[1]} to fit memory budget")
+        return image
+
+    def decode(self, image, usage: Optional[RequestMemory] = None) -> np.ndarray:
+        """
+        Fit an opened PIL image to the budget and decode it
+
+        Both steps touch every pixel, so call this through asyncio.to_thread; the
+        request's stage records follow it into the worker thread.
+
+        Returns:
+            Read-only view of the decoded pixels
+        """
+        with stage("decode"):
+            # Downscaling a PNG/TIFF decodes it in full, so it counts towards the stage
+            return np.asarray(self.fit_to_budget(image, usage))
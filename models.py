@@ -3,6 +3,7 @@ AI Models for Rice Field Monitoring
 - U-Net for weed detection
 - CNN for fertilizer analysis
 - Ensemble for yield prediction
+- Multi-task U-Net sharing one encoder across weed, NPK and yield heads
 """
 
 import torch
@@ -10,6 +11,10 @@ import torch.nn as nn
 import numpy as np
 from PIL import Image
 import logging
+import time
+from config import MODEL_CONFIG
+from yield_ensemble import load_yield_engine
+from preprocessing import get_buffer_pool
 
 logger = logging.getLogger(__name__)
 
@@ -79,58 +84,81 @@ class UNetWeedDetector:
         if not self.loaded:
             return self._fallback_weed_detection(image_array)
         
+        prepared = None
         try:
-            # Convert to tensor and normalize
-            tensor = torch.from_numpy(image_array).float()
-            
-            # Ensure 5 channels
-            if len(tensor.shape) == 2:
-                # Grayscale - expand to 5 channels by repeating
-                tensor = tensor.unsqueeze(0).repeat(5, 1, 1)
-            elif tensor.shape[2] != 5:
-                # Adjust channels if not 5
-                tensor = self._adjust_channels(tensor, target_channels=5)
-            
-            # Add batch dimension and move to device
-            tensor = tensor.permute(2, 0, 1).unsqueeze(0).to(self.device)
+            # Model input written straight into a pooled channel-first buffer
+            prepared = get_buffer_pool().prepare(image_array)
             
             # Inference
             with torch.no_grad():
-                segmentation_mask = self.model(tensor)
+                segmentation_mask = self.model(prepared.tensor(self.device))
                 segmentation_mask = torch.sigmoid(segmentation_mask)
             
             # Convert to numpy
-            mask = segmentation_mask.squeeze().cpu().numpy()
-            
-            # Calculate statistics
-            weed_confidence = float(mask.max())
-            weed_coverage = float((mask > 0.5).sum() / mask.size * 100)
-            
-            return {
-                "detected": weed_coverage > 1.0,
-                "confidence": round(weed_confidence * 100, 1),
-                "coverage": round(weed_coverage, 2),
-                "segmentation_mask": mask,
-                "weed_types": self._classify_weed_type(mask, weed_confidence),
-                "model": "U-Net (Actual)"
-            }
+            mask = prepared.crop(segmentation_mask.squeeze().cpu().numpy())
+            results = self._summarize_mask(mask)
+            results["preprocess"] = prepared.stats()
+            return results
         
         except Exception as e:
             logger.error(f"Weed detection error: {e}")
             return self._fallback_weed_detection(image_array)
+        finally:
+            if prepared is not None:
+                prepared.release()
+    
+    def _segment(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Sigmoid segmentation mask for a (N, 5, H, W) batch"""
+        return torch.sigmoid(self.model(tensor))
     
-    def _adjust_channels(self, tensor: torch.Tensor, target_channels=5) -> torch.Tensor:
-        """Adjust tensor to target number of channels"""
-        current_channels = tensor.shape[2] if len(tensor.shape) == 3 else 1
+    def segment_tiles(self, image_array: np.ndarray, boxes: list, halo=16, batch_size=8) -> list:
+        """
+        Segment rectangular regions of an image with the U-Net
         
-        if current_channels >= target_channels:
-            return tensor[..., :target_channels]
-        else:
-            # Repeat channels to reach target
-            repeated = tensor
-            while repeated.shape[2] < target_channels:
-                repeated = torch.cat([repeated, tensor], dim=2)
-            return repeated[..., :target_channels]
+        Args:
+            image_array: Image (H, W[, C])
+            boxes: Regions as (y0, x0, y1, x1)
+            halo: Context pixels added around each region to avoid seams
+            batch_size: Regions run through the model together
+        
+        Returns:
+            list of float32 masks, one (y1 - y0, x1 - x0) array per box
+        """
+        height, width = image_array.shape[:2]
+        masks = []
+        for start in range(0, len(boxes), batch_size):
+            batch = boxes[start:start + batch_size]
+            # Same padded size for the whole batch, rounded up to the U-Net's /16 stride
+            patch_h = -(-(max(y1 - y0 for y0, _, y1, _ in batch) + 2 * halo) // 16) * 16
+            patch_w = -(-(max(x1 - x0 for _, x0, _, x1 in batch) + 2 * halo) // 16) * 16
+            
+            # Patches get the same channel mapping and normalization as full frames
+            patches = get_buffer_pool().allocate_batch(len(batch), patch_h, patch_w)
+            for patch, (y0, x0, _, _) in zip(patches, batch):
+                # Edge-replicated context where the halo leaves the image
+                rows = np.clip(np.arange(y0 - halo, y0 - halo + patch_h), 0, height - 1)
+                cols = np.clip(np.arange(x0 - halo, x0 - halo + patch_w), 0, width - 1)
+                get_buffer_pool().fill(patch, image_array[rows][:, cols])
+            
+            with torch.no_grad():
+                output = self._segment(torch.from_numpy(patches).to(self.device)).squeeze(1).cpu().numpy()
+            for (y0, x0, y1, x1), mask in zip(batch, output):
+                masks.append(mask[halo:halo + y1 - y0, halo:halo + x1 - x0])
+        return masks
+    
+    def _summarize_mask(self, mask: np.ndarray) -> dict:
+        """Build weed detection results from a sigmoid segmentation mask"""
+        weed_confidence = float(mask.max())
+        weed_coverage = float((mask > 0.5).sum() / mask.size * 100)
+        
+        return {
+            "detected": weed_coverage > 1.0,
+            "confidence": round(weed_confidence * 100, 1),
+            "coverage": round(weed_coverage, 2),
+            "segmentation_mask": mask,
+            "weed_types": self._classify_weed_type(mask, weed_confidence),
+            "model": "U-Net (Actual)"
+        }
     
     def _classify_weed_type(self, mask: np.ndarray, confidence: float) -> list:
         """Classify weed type based on segmentation patterns"""
@@ -205,6 +233,10 @@ class UNet(nn.Module):
         )
     
     def forward(self, x):
+        return self.decode(*self.encode(x))
+    
+    def encode(self, x):
+        """Run the encoder and bottleneck, returning features and skip connections"""
         # Encoder
         enc1 = self.enc1(x)
         x = self.pool1(enc1)
@@ -217,6 +249,11 @@ class UNet(nn.Module):
         
         # Bottleneck
         x = self.bottleneck(x)
+        return x, (enc1, enc2, enc3, enc4)
+    
+    def decode(self, x, skips):
+        """Run the decoder on bottleneck features to produce segmentation logits"""
+        enc1, enc2, enc3, enc4 = skips
         
         # Decoder
         x = self.upconv4(x)
@@ -240,13 +277,199 @@ class UNet(nn.Module):
         return x
 
 
-# Global weed detector instance
+class RegressionHead(nn.Module):
+    """Lightweight regression head reading pooled U-Net bottleneck features"""
+    
+    def __init__(self, in_channels=1024, hidden_features=64, out_features=1):
+        super(RegressionHead, self).__init__()
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.fc = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(in_channels, hidden_features),
+            nn.ReLU(inplace=True),
+            nn.Linear(hidden_features, out_features)
+        )
+    
+    def forward(self, features):
+        return self.fc(self.pool(features))
+
+
+# Task heads that read the shared encoder features. "segmentation" is the
+# U-Net decoder itself and is always part of the backbone.
+HEAD_REGISTRY = {
+    "npk": lambda: RegressionHead(out_features=3),
+    "yield": lambda: RegressionHead(out_features=1),
+}
+
+
+class MultiTaskUNet(nn.Module):
+    """U-Net whose encoder is shared by the segmentation decoder and regression heads"""
+    
+    def __init__(self, in_channels=5, out_channels=1, heads=("npk", "yield")):
+        super(MultiTaskUNet, self).__init__()
+        self.backbone = UNet(in_channels=in_channels, out_channels=out_channels)
+        self.heads = nn.ModuleDict({name: HEAD_REGISTRY[name]() for name in heads})
+    
+    def forward(self, x):
+        features, skips = self.backbone.encode(x)
+        outputs = {"segmentation": self.backbone.decode(features, skips)}
+        for name, head in self.heads.items():
+            outputs[name] = head(features)
+        return outputs
+
+
+class MultiTaskFieldModel(UNetWeedDetector):
+    """Shared-encoder model producing weed masks, NPK needs and yield in one pass"""
+    
+    def __init__(self, model_path="unet_model.pth", heads_path="heads_model.pth",
+                 enabled_heads=("segmentation", "npk", "yield"), device='cpu'):
+        """
+        Initialize multi-task model
+        
+        Args:
+            model_path: Path to trained U-Net weights (shared encoder + decoder)
+            heads_path: Path to trained regression head weights
+            enabled_heads: Heads to run; any of "segmentation", "npk", "yield"
+            device: 'cpu' or 'cuda'
+        """
+        unknown = set(enabled_heads) - set(HEAD_REGISTRY) - {"segmentation"}
+        if unknown:
+            raise ValueError(f"Unknown model heads: {', '.join(sorted(unknown))}")
+        
+        self.heads_path = heads_path
+        self.enabled_heads = list(enabled_heads)
+        self.active_heads = []
+        super(MultiTaskFieldModel, self).__init__(model_path=model_path, device=device)
+    
+    def load_model(self):
+        """Load shared U-Net weights and any trained regression heads"""
+        regression_heads = [name for name in self.enabled_heads if name in HEAD_REGISTRY]
+        self.model = MultiTaskUNet(in_channels=5, out_channels=1, heads=regression_heads)
+        
+        try:
+            checkpoint = torch.load(self.model_path, map_location=self.device)
+            if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+                self.model.backbone.load_state_dict(checkpoint['model_state_dict'])
+            else:
+                self.model.backbone.load_state_dict(checkpoint)
+        except FileNotFoundError:
+            logger.warning(f"Model file not found at {self.model_path}")
+            self.loaded = False
+            return
+        except Exception as e:
+            logger.error(f"Error loading U-Net model: {e}")
+            self.loaded = False
+            return
+        
+        # Heads may ship inside the U-Net checkpoint or in their own file
+        head_state = checkpoint.get('heads_state_dict') if isinstance(checkpoint, dict) else None
+        if head_state is None and regression_heads:
+            try:
+                head_state = torch.load(self.heads_path, map_location=self.device)
+                if isinstance(head_state, dict) and 'heads_state_dict' in head_state:
+                    head_state = head_state['heads_state_dict']
+            except FileNotFoundError:
+                logger.warning(f"Head weights not found at {self.heads_path}")
+            except Exception as e:
+                logger.error(f"Error loading model heads: {e}")
+        
+        trained_heads = []
+        for name in regression_heads:
+            prefix = f"{name}."
+            state = {k[len(prefix):]: v for k, v in (head_state or {}).items() if k.startswith(prefix)}
+            if not state:
+                logger.warning(f"No trained weights for '{name}' head, disabling it")
+                continue
+            try:
+                self.model.heads[name].load_state_dict(state)
+                trained_heads.append(name)
+            except Exception as e:
+                logger.error(f"Error loading '{name}' head: {e}")
+        
+        self.active_heads = [name for name in self.enabled_heads
+                             if name == "segmentation" or name in trained_heads]
+        self.model.to(self.device)
+        self.model.eval()
+        self.loaded = True
+        logger.info(f"Multi-task U-Net loaded with heads: {', '.join(self.active_heads) or 'none'}")
+    
+    def _segment(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Sigmoid segmentation mask from the shared backbone only"""
+        return torch.sigmoid(self.model.backbone(tensor))
+    
+    def predict(self, image_array: np.ndarray) -> dict:
+        """
+        Run the shared encoder once and every active head on its features
+        
+        Args:
+            image_array: 5-channel multispectral image (H, W, 5)
+        
+        Returns:
+            dict with weed detection results, plus "nutrients" (0-1 NPK needs),
+            "yield" (tons/hectare) and per-stage "timings_ms" from active heads
+        """
+        if not self.loaded:
+            return self._fallback_weed_detection(image_array)
+        
+        prepared = None
+        try:
+            # Model input written straight into a pooled channel-first buffer
+            prepared = get_buffer_pool().prepare(image_array)
+            outputs = {}
+            timings = {}
+            
+            with torch.no_grad():
+                start = time.perf_counter()
+                features, skips = self.model.backbone.encode(prepared.tensor(self.device))
+                timings["encoder"] = time.perf_counter() - start
+                
+                for name in self.active_heads:
+                    start = time.perf_counter()
+                    if name == "segmentation":
+                        outputs[name] = torch.sigmoid(self.model.backbone.decode(features, skips))
+                    else:
+                        # Pool only over cells covering the image, not the bucket padding
+                        outputs[name] = self.model.heads[name](prepared.crop_features(features))
+                    timings[name] = time.perf_counter() - start
+            
+            if "segmentation" in outputs:
+                results = self._summarize_mask(prepared.crop(outputs["segmentation"].squeeze().cpu().numpy()))
+            else:
+                results = self._fallback_weed_detection(image_array)
+            
+            if "npk" in outputs:
+                n, p, k = torch.sigmoid(outputs["npk"]).squeeze(0).tolist()
+                results["nutrients"] = {"nitrogen": n, "phosphorus": p, "potassium": k}
+            if "yield" in outputs:
+                results["yield"] = float(outputs["yield"].item())
+            
+            results["timings_ms"] = {name: round(t * 1000, 2) for name, t in timings.items()}
+            results["preprocess"] = prepared.stats()
+            logger.debug(f"Multi-task inference timings (ms): {results['timings_ms']}, "
+                         f"input buffer: {results['preprocess']}")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Multi-task inference error: {e}")
+            return self._fallback_weed_detection(image_array)
+        finally:
+            if prepared is not None:
+                prepared.release()
+
+
+# Global field model instance (shared encoder, weed detection + task heads)
 weed_detector = None
 
 def initialize_models():
     """Initialize all AI models"""
     global weed_detector
-    weed_detector = UNetWeedDetector()
+    weed_detector = MultiTaskFieldModel(
+        model_path=MODEL_CONFIG["unet_model_path"],
+        heads_path=MODEL_CONFIG["heads_model_path"],
+        enabled_heads=MODEL_CONFIG["enabled_heads"],
+        device=MODEL_CONFIG["device"]
+    )
+    load_yield_engine(MODEL_CONFIG["yield_ensemble_path"])
     return weed_detector
 
 def get_weed_detector():
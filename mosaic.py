@@ -0,0 +1,399 @@
+"""
+Streaming field mosaics
+- Overlapping photos of a field registered against the canvas by phase correlation
+- Feathered blending into a tiled canvas of memory-mapped .npy files on disk
+- Per-tile image, weight, weed mask and vegetation index layers kept up to date
+- Field-wide statistics from a small per-tile summary index, never the whole canvas
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from change_detection import estimate_shift
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationFailed(Exception):
+    """Raised when a frame cannot be placed on the mosaic unambiguously"""
+
+
+def _feather(height: int, width: int) -> np.ndarray:
+    """Blend weight rising linearly from each frame edge, so seams fade out"""
+    rows = np.minimum(np.arange(height), np.arange(height)[::-1]) + 1
+    cols = np.minimum(np.arange(width), np.arange(width)[::-1]) + 1
+    return np.minimum.outer(rows, cols).astype(np.float32)
+
+
+class FieldMosaic:
+    """One field's mosaic: tiled memory-mapped canvas plus a JSON summary index"""
+
+    def __init__(self, directory: str, tile_size: int = 512, registration_stride: int = 4,
+                 search_frames: int = 3, max_open_tiles: int = 16):
+        """
+        Open (or create) a mosaic
+
+        Args:
+            directory: Folder holding the tile files and index.json
+            tile_size: Side of each canvas tile in pixels
+            registration_stride: Subsampling of frame and canvas for phase correlation
+            search_frames: Recent frames whose canvas windows the new frame is registered against
+            max_open_tiles: Memory-mapped tiles kept open between frames
+        """
+        self.directory = directory
+        self.tile_size = tile_size
+        self.registration_stride = registration_stride
+        self.search_frames = search_frames
+        self.max_open_tiles = max_open_tiles
+        self._open: "OrderedDict[Tuple[int, int], np.memmap]" = OrderedDict()
+        # Frames of one field may arrive concurrently; registration depends on the previous one
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.index = {"channels": None, "dtype": None, "layers": [], "frames": [], "tiles": {}, "bounds": None}
+        try:
+            with open(self._index_path, 'r') as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            pass
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    @property
+    def image_dtype(self) -> np.dtype:
+        """Pixel type of the frames (indexes written before it was recorded are 8-bit)"""
+        return np.dtype(self.index.get("dtype") or np.uint8)
+
+    def _dtype(self) -> np.dtype:
+        fields = [("image", self.image_dtype, (self.index["channels"],)), ("weight", np.float32)]
+        fields += [(name, np.float16) for name in self.index["layers"]]
+        return np.dtype(fields)
+
+    # Tile storage
+
+    def _tile(self, ty: int, tx: int, create: bool = False) -> Optional[np.memmap]:
+        """Memory-mapped (tile, tile) structured array for a tile, or None if it does not exist"""
+        key = (ty, tx)
+        tile = self._open.get(key)
+        if tile is not None:
+            self._open.move_to_end(key)
+            return tile
+        path = os.path.join(self.directory, f"tile_{ty}_{tx}.npy")
+        if os.path.exists(path):
+            tile = np.lib.format.open_memmap(path, mode='r+')
+        elif create:
+            tile = np.lib.format.open_memmap(path, mode='w+', dtype=self._dtype(),
+                                             shape=(self.tile_size, self.tile_size))
+        else:
+            return None
+        self._open[key] = tile
+        while len(self._open) > self.max_open_tiles:
+            _, evicted = self._open.popitem(last=False)
+            evicted.flush()
+        return tile
+
+    def _tiles_overlapping(self, y0: int, x0: int, y1: int, x1: int) -> Iterator[Tuple[int, int]]:
+        size = self.tile_size
+        for ty in range(y0 // size, (y1 - 1) // size + 1):
+            for tx in range(x0 // size, (x1 - 1) // size + 1):
+                yield ty, tx
+
+    def read(self, y0: int, x0: int, y1: int, x1: int, layer: str = "image") -> np.ndarray:
+        """Read a canvas window of one layer (zeros where nothing was painted)"""
+        if layer == "image":
+            out = np.zeros((y1 - y0, x1 - x0, self.index["channels"]), dtype=self.image_dtype)
+        else:
+            out = np.zeros((y1 - y0, x1 - x0), dtype=np.float32)
+        size = self.tile_size
+        for ty, tx in self._tiles_overlapping(y0, x0, y1, x1):
+            tile = self._tile(ty, tx)
+            if tile is None:
+                continue
+            ty0, tx0 = ty * size, tx * size
+            ys, ye = max(y0, ty0), min(y1, ty0 + size)
+            xs, xe = max(x0, tx0), min(x1, tx0 + size)
+            out[ys - y0:ye - y0, xs - x0:xe - x0] = tile[layer][ys - ty0:ye - ty0, xs - tx0:xe - tx0]
+        return out
+
+    # Registration
+
+    def _gray(self, image_array: np.ndarray) -> np.ndarray:
+        stride = self.registration_stride
+        small = image_array[::stride, ::stride].astype(np.float32)
+        return small.mean(axis=2) if small.ndim == 3 else small
+
+    def _reference(self, y0: int, x0: int, height: int, width: int):
+        """Subsampled gray canvas window and its painted mask"""
+        stride = self.registration_stride
+        window = self.read(y0, x0, y0 + height, x0 + width)[::stride, ::stride]
+        painted = self.read(y0, x0, y0 + height, x0 + width, "weight")[::stride, ::stride] > 0
+        return window.astype(np.float32).mean(axis=2), painted
+
+    def _misfit(self, gray: np.ndarray, offset: Tuple[int, int]) -> float:
+        """Mean absolute difference between the frame and the painted canvas under it"""
+        height, width = gray.shape[0] * self.registration_stride, gray.shape[1] * self.registration_stride
+        reference, painted = self._reference(offset[0], offset[1], height, width)
+        reference, painted = reference[:gray.shape[0], :gray.shape[1]], painted[:gray.shape[0], :gray.shape[1]]
+        # Too little overlap to judge the placement
+        if painted.mean() < 0.1:
+            return np.inf
+        return float(np.abs(reference - gray)[painted].mean())
+
+    def register(self, image_array: np.ndarray) -> Tuple[int, int]:
+        """
+        Canvas offset (y, x) of a new frame's top-left corner
+
+        The frame is phase-correlated (both subsampled) with the canvas windows under the
+        last few frames (photos of one field can finish analysis out of order) and one step
+        further along the camera's path; of those peaks and their wraparound aliases, the
+        placement that best matches the painted canvas wins and is refined at full resolution on the frame centre. Unpainted canvas in a
+        window is filled with the painted mean.
+        """
+        frames = self.index["frames"]
+        if not frames:
+            return 0, 0
+        height, width = image_array.shape[:2]
+        stride = self.registration_stride
+        gray = self._gray(image_array)
+        rows, cols = gray.shape
+
+        origins = [tuple(frame["offset"]) for frame in frames[-self.search_frames:]][::-1]
+        if len(frames) > 1:
+            (last_y, last_x), (prev_y, prev_x) = frames[-1]["offset"], frames[-2]["offset"]
+            origins.append((2 * last_y - prev_y, 2 * last_x - prev_x))
+
+        candidates = {}
+        for origin_y, origin_x in origins:
+            reference, painted = self._reference(origin_y, origin_x, height, width)
+            if painted.any():
+                reference[~painted] = reference[painted].mean()
+            dy, dx = estimate_shift(reference, gray)
+            # Content at reference (y, x) appears at frame (y + dy, x + dx). The correlation
+            # is circular, so a shift near half the window also peaks at shift -/+ window:
+            # try every alias and let the fit to the painted canvas decide
+            for alias_y in (dy - rows, dy, dy + rows):
+                for alias_x in (dx - cols, dx, dx + cols):
+                    if abs(alias_y) >= rows or abs(alias_x) >= cols:
+                        continue
+                    offset = (origin_y - alias_y * stride, origin_x - alias_x * stride)
+                    if offset not in candidates:
+                        candidates[offset] = self._misfit(gray, offset)
+
+        ranked = sorted(candidates.items(), key=lambda item: item[1])
+        best, best_misfit = ranked[0]
+        # A frame differs from unrelated canvas by about its own contrast
+        contrast = float(np.abs(gray - gray.mean()).mean())
+        if not best_misfit < contrast:
+            raise RegistrationFailed("photo does not overlap the mapped area")
+        for offset, misfit in ranked[1:]:
+            far = max(abs(offset[0] - best[0]), abs(offset[1] - best[1])) > 4 * stride
+            if far and misfit < 1.1 * best_misfit:
+                raise RegistrationFailed(f"photo fits the map at both {best} and {offset}")
+        return self._refine(image_array, best) if stride > 1 else best
+
+    def _refine(self, image_array: np.ndarray, offset: Tuple[int, int], size: int = 256) -> Tuple[int, int]:
+        """Correct the subsampled registration by phase correlation of a full-resolution crop of the overlap"""
+        height, width = image_array.shape[:2]
+        size_y, size_x = min(size, height), min(size, width)
+        # Centre the crop on the painted part of the frame
+        stride = self.registration_stride
+        _, painted = self._reference(offset[0], offset[1], height, width)
+        rows, cols = np.nonzero(painted)
+        cy = int(np.clip(rows.mean() * stride - size_y // 2, 0, height - size_y))
+        cx = int(np.clip(cols.mean() * stride - size_x // 2, 0, width - size_x))
+        y0, x0 = offset[0] + cy, offset[1] + cx
+        painted = self.read(y0, x0, y0 + size_y, x0 + size_x, "weight") > 0
+        if painted.mean() < 0.5:
+            return offset
+        reference = self.read(y0, x0, y0 + size_y, x0 + size_x).astype(np.float32).mean(axis=2)
+        reference[~painted] = reference[painted].mean()
+        crop = image_array[cy:cy + size_y, cx:cx + size_x].astype(np.float32)
+        dy, dx = estimate_shift(reference, crop.mean(axis=2) if crop.ndim == 3 else crop)
+        # The residual is at most a few subsampled pixels; anything larger is a false peak
+        if max(abs(dy), abs(dx)) > 2 * stride:
+            return offset
+        return offset[0] - dy, offset[1] - dx
+
+    # Blending
+
+    def add_frame(self, image_array: np.ndarray, layers: Optional[Dict[str, np.ndarray]] = None,
+                  offset: Optional[Tuple[int, int]] = None) -> Dict:
+        """
+        Register a frame and blend it, with its layers, into the canvas
+
+        Args:
+            image_array: Frame (H, W[, C]) with the same channel count and pixel type as earlier frames
+            layers: Optional per-pixel (H, W) maps, e.g. "weed" mask and NDVI/NDRE/GNDVI
+            offset: Known canvas position (y, x); registered by phase correlation when None
+
+        Returns:
+            dict with the frame's offset, tiles touched and seconds taken
+        """
+        with self._lock:
+            return self._add_frame(image_array, layers, offset)
+
+    def _add_frame(self, image_array: np.ndarray, layers: Optional[Dict[str, np.ndarray]],
+                   offset: Optional[Tuple[int, int]]) -> Dict:
+        start = time.perf_counter()
+        image = image_array if image_array.ndim == 3 else image_array[..., None]
+        layers = {name: value for name, value in (layers or {}).items() if value is not None}
+        if self.index["channels"] is None:
+            self.index["channels"] = image.shape[2]
+            self.index["dtype"] = image.dtype.str
+            self.index["layers"] = sorted(layers)
+        elif image.shape[2] != self.index["channels"]:
+            raise ValueError(f"Mosaic has {self.index['channels']} channels, frame has {image.shape[2]}")
+        elif image.dtype != self.image_dtype:
+            raise ValueError(f"Mosaic has {self.image_dtype} pixels, frame has {image.dtype}")
+
+        y0, x0 = offset if offset is not None else self.register(image_array)
+        height, width = image.shape[:2]
+        y1, x1 = y0 + height, x0 + width
+        feather = _feather(height, width)
+        integer = np.issubdtype(image.dtype, np.integer)
+        size = self.tile_size
+
+        touched = 0
+        for ty, tx in self._tiles_overlapping(y0, x0, y1, x1):
+            tile = self._tile(ty, tx, create=True)
+            ty0, tx0 = ty * size, tx * size
+            ys, ye = max(y0, ty0), min(y1, ty0 + size)
+            xs, xe = max(x0, tx0), min(x1, tx0 + size)
+            canvas = tile[ys - ty0:ye - ty0, xs - tx0:xe - tx0]
+            frame_rows, frame_cols = slice(ys - y0, ye - y0), slice(xs - x0, xe - x0)
+
+            # Running weighted average per layer: new = (old * w + value * f) / (w + f)
+            old_weight = canvas["weight"]
+            new_weight = feather[frame_rows, frame_cols]
+            total = old_weight + new_weight
+            keep, add = old_weight / total, new_weight / total
+            blended = canvas["image"] * keep[..., None] + image[frame_rows, frame_cols] * add[..., None]
+            canvas["image"] = np.rint(blended) if integer else blended
+            for name in self.index["layers"]:
+                if name in layers:
+                    canvas[name] = canvas[name] * keep + layers[name][frame_rows, frame_cols] * add
+            canvas["weight"] = total
+            self._summarize_tile(ty, tx, tile)
+            touched += 1
+
+        bounds = self.index["bounds"] or [y0, x0, y1, x1]
+        self.index["bounds"] = [min(bounds[0], y0), min(bounds[1], x0), max(bounds[2], y1), max(bounds[3], x1)]
+        self.index["frames"].append({"offset": [int(y0), int(x0)], "shape": [height, width], "time": time.time()})
+        self.flush()
+        return {"offset": (int(y0), int(x0)), "tiles_touched": touched,
+                "seconds": round(time.perf_counter() - start, 3)}
+
+    def _summarize_tile(self, ty: int, tx: int, tile: np.memmap) -> None:
+        """Refresh the tile's entry in the summary index (sums, so field stats are exact)"""
+        covered = tile["weight"] > 0
+        summary = {"pixels": int(covered.sum())}
+        for name in self.index["layers"]:
+            values = tile[name][covered].astype(np.float64)
+            if name == "weed":
+                summary["weed_pixels"] = int((values > 0.5).sum())
+            else:
+                summary[f"{name}_sum"] = float(values.sum())
+        self.index["tiles"][f"{ty},{tx}"] = summary
+
+    def flush(self) -> None:
+        """Flush open tiles and atomically write the summary index"""
+        for tile in self._open.values():
+            tile.flush()
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def close(self) -> None:
+        self.flush()
+        self._open.clear()
+
+    # Field-wide views
+
+    def stats(self) -> Dict:
+        """Field-wide coverage, index means and weed share from the tile summaries"""
+        with self._lock:
+            return self._stats()
+
+    def _stats(self) -> Dict:
+        tiles = self.index["tiles"].values()
+        pixels = sum(tile["pixels"] for tile in tiles)
+        bounds = self.index["bounds"]
+        result = {
+            "frames": len(self.index["frames"]),
+            "tiles": len(self.index["tiles"]),
+            "canvas": f"{bounds[3] - bounds[1]}x{bounds[2] - bounds[0]}" if bounds else "0x0",
+            "covered_pixels": pixels,
+        }
+        if not pixels:
+            return result
+        for name in self.index["layers"]:
+            if name == "weed":
+                result["weed_coverage"] = round(100 * sum(tile["weed_pixels"] for tile in tiles) / pixels, 2)
+            else:
+                result[name] = round(sum(tile[f"{name}_sum"] for tile in tiles) / pixels, 3)
+        return result
+
+    def overview(self, max_side: int = 1024, layer: str = "image") -> np.ndarray:
+        """Downsampled view of the whole canvas, read tile by tile with a stride"""
+        y0, x0, y1, x1 = self.index["bounds"]
+        stride = max(1, -(-max(y1 - y0, x1 - x0) // max_side))
+        out_h, out_w = -(-(y1 - y0) // stride), -(-(x1 - x0) // stride)
+        if layer == "image":
+            out = np.zeros((out_h, out_w, self.index["channels"]), dtype=self.image_dtype)
+        else:
+            out = np.zeros((out_h, out_w), dtype=np.float32)
+        size = self.tile_size
+        for key in self.index["tiles"]:
+            ty, tx = (int(value) for value in key.split(","))
+            tile = self._tile(ty, tx)
+            # Canvas pixels of this tile that fall on the output grid
+            first_y = y0 + max(0, -(-(ty * size - y0) // stride)) * stride
+            first_x = x0 + max(0, -(-(tx * size - x0) // stride)) * stride
+            rows = np.arange(first_y, ty * size + size, stride)
+            cols = np.arange(first_x, tx * size + size, stride)
+            rows, cols = rows[rows < y1], cols[cols < x1]
+            if rows.size and cols.size:
+                out[np.ix_((rows - y0) // stride, (cols - x0) // stride)] = tile[layer][np.ix_(rows - ty * size, cols - tx * size)]
+        return out
+
+
+class MosaicStore:
+    """Mosaics per field, opened on demand"""
+
+    def __init__(self, root: str = "mosaics", tile_size: int = 512, registration_stride: int = 4,
+                 search_frames: int = 3, max_open_tiles: int = 16):
+        self.root = root
+        self.tile_size = tile_size
+        self.registration_stride = registration_stride
+        self.search_frames = search_frames
+        self.max_open_tiles = max_open_tiles
+        self._mosaics: Dict[str, FieldMosaic] = {}
+        # get() runs on worker threads; two frames of a new field must share one FieldMosaic
+        self._lock = threading.Lock()
+
+    def get(self, field_id: str) -> FieldMosaic:
+        with self._lock:
+            mosaic = self._mosaics.get(field_id)
+            if mosaic is None:
+                directory = os.path.join(self.root, re.sub(r'[^A-Za-z0-9_-]+', '_', field_id))
+                mosaic = self._mosaics[field_id] = FieldMosaic(
+                    directory, self.tile_size, self.registration_stride, self.search_frames, self.max_open_tiles)
+            return mosaic
+
+    def close(self) -> None:
+        with self._lock:
+            mosaics = list(self._mosaics.values())
+            self._mosaics.clear()
+        for mosaic in mosaics:
+            mosaic.close()
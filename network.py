@@ -0,0 +1,135 @@
+"""
+Telegram networking
+- Separate connection pools for API sends, long polling and file downloads
+- Keep-alive connections reused across requests
+- Bounded parallel downloads streamed chunk by chunk into the decode buffer
+- Optional local Bot API endpoint (BOT_API_BASE_URL, e.g. fake_bot_api.py)
+"""
+
+import asyncio
+import io
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# e.g. http://127.0.0.1:8081 to run against fake_bot_api.py or a local Bot API server
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL")
+
+
+class DownloadTooLarge(Exception):
+    """Raised when a file is larger than the download limit"""
+
+
+def build_send_request(config: Dict) -> HTTPXRequest:
+    """Pool for sendMessage, editMessageText, getFile and other API calls"""
+    return HTTPXRequest(
+        connection_pool_size=config["send_pool_size"],
+        connect_timeout=config["connect_timeout"],
+        read_timeout=config["read_timeout"],
+        write_timeout=config["write_timeout"],
+        pool_timeout=config["pool_timeout"],
+        httpx_kwargs={"limits": httpx.Limits(
+            max_connections=config["send_pool_size"],
+            max_keepalive_connections=config["send_pool_size"],
+            keepalive_expiry=config["keepalive_expiry"],
+        )},
+    )
+
+
+def build_polling_request(config: Dict) -> HTTPXRequest:
+    """Dedicated connection for getUpdates so long polls never wait behind sends"""
+    return HTTPXRequest(
+        connection_pool_size=1,
+        connect_timeout=config["connect_timeout"],
+        read_timeout=config["polling_read_timeout"],
+        pool_timeout=config["pool_timeout"],
+    )
+
+
+def api_urls(base_url: Optional[str] = BOT_API_BASE_URL) -> Dict[str, str]:
+    """ApplicationBuilder base_url/base_file_url for a custom Bot API endpoint (empty for Telegram)"""
+    if not base_url:
+        return {}
+    base_url = base_url.rstrip("/")
+    return {"base_url": f"{base_url}/bot", "base_file_url": f"{base_url}/file/bot"}
+
+
+class FileDownloader:
+    """Streams Telegram files over their own keep-alive pool with bounded parallelism"""
+
+    def __init__(self, pool_size: int = 8, max_parallel: int = 4, timeout: float = 60,
+                 keepalive_expiry: float = 30, chunk_size: int = 65536, max_bytes: Optional[int] = None):
+        """
+        Initialize downloader
+
+        Args:
+            pool_size: Connections kept for downloads (separate from the send pool)
+            max_parallel: Downloads allowed in flight at once
+            timeout: Read timeout per chunk in seconds
+            keepalive_expiry: Seconds an idle connection is kept open
+            chunk_size: Bytes read from the socket per chunk
+            max_bytes: Refuse files larger than this (None for no limit)
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.semaphore = asyncio.Semaphore(max_parallel)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.downloads = 0
+        self.bytes_downloaded = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    async def download(self, bot, file_id: str) -> io.BytesIO:
+        """
+        Download a file into memory
+
+        Resolves the file through the bot (send pool), then streams the body into a
+        BytesIO without first buffering the whole response.
+
+        Returns:
+            BytesIO positioned at the start, ready for Image.open
+
+        Raises:
+            DownloadTooLarge: When the file exceeds max_bytes
+        """
+        file = await bot.get_file(file_id)
+        if self.max_bytes and file.file_size and file.file_size > self.max_bytes:
+            raise DownloadTooLarge(f"file is {file.file_size / 1e6:.1f} MB, limit is {self.max_bytes / 1e6:.0f} MB")
+
+        out = io.BytesIO()
+        async with self.semaphore:
+            async with self.client.stream("GET", file.file_path) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    out.write(chunk)
+                    if self.max_bytes and out.tell() > self.max_bytes:
+                        raise DownloadTooLarge(f"file exceeds {self.max_bytes / 1e6:.0f} MB")
+
+        self.downloads += 1
+        self.bytes_downloaded += out.tell()
+        out.seek(0)
+        return out
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,190 @@
+"""
+Copy-free image preprocessing for U-Net input
+- Size-bucketed pool of reusable channel-first float32 buffers
+- Channel mapping and dtype conversion written straight into the pooled buffer
+- In-place normalization; the model reads the buffer through torch.from_numpy
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+from config import PREPROCESS_CONFIG
+from memory_budget import record_input
+
+logger = logging.getLogger(__name__)
+
+MODEL_CHANNELS = 5
+
+
+def channel_map(source_channels: int, target_channels: int = MODEL_CHANNELS) -> List[int]:
+    """Source channel feeding each model channel (source channels repeat cyclically, e.g. RGB -> R G B R G)"""
+    return [i % source_channels for i in range(target_channels)]
+
+
+class PreparedImage:
+    """Model input living in a pooled (5, H_bucket, W_bucket) float32 buffer"""
+
+    def __init__(self, pool: "BufferPool", buffer: np.ndarray, height: int, width: int,
+                 allocated: bool, bytes_copied: int):
+        self.pool = pool
+        self.buffer = buffer
+        self.height = height
+        self.width = width
+        self.allocated = allocated
+        self.bytes_copied = bytes_copied
+
+    def tensor(self, device='cpu'):
+        """(1, 5, H_bucket, W_bucket) tensor sharing the buffer's memory on CPU"""
+        return torch.from_numpy(self.buffer).unsqueeze(0).to(device)
+
+    def crop(self, mask: np.ndarray) -> np.ndarray:
+        """Crop a bucket-sized output back to the image size"""
+        return mask[..., :self.height, :self.width]
+
+    def crop_features(self, features, stride: int = 16):
+        """Crop (N, C, H/stride, W/stride) encoder features to the cells covering the image, dropping padding"""
+        return features[..., :-(-self.height // stride), :-(-self.width // stride)]
+
+    def stats(self) -> Dict:
+        return {
+            "buffer": "allocated" if self.allocated else "reused",
+            "bucket": self.buffer.shape[1:],
+            "bytes_copied": self.bytes_copied,
+        }
+
+    def release(self) -> None:
+        """Return the buffer to the pool; the tensor must no longer be used"""
+        if self.buffer is not None:
+            self.pool.release(self.buffer)
+            self.buffer = None
+
+
+class BufferPool:
+    """Reusable model-input buffers bucketed by padded image size"""
+
+    def __init__(self, bucket_size: int = 32, max_per_bucket: int = 2, max_pool_mb: float = 512,
+                 input_scale: float = 1.0, input_offset: float = 0.0):
+        """
+        Initialize buffer pool
+
+        Args:
+            bucket_size: Height and width are rounded up to a multiple of this
+                         (keep it a multiple of 16 so the U-Net can downsample 4 times)
+            max_per_bucket: Idle buffers kept per bucket
+            max_pool_mb: Upper bound on idle buffer memory across all buckets
+            input_scale: Multiplier applied in place to the model input
+            input_offset: Subtracted in place after scaling
+        """
+        self.bucket_size = bucket_size
+        self.max_per_bucket = max_per_bucket
+        self.max_pool_bytes = int(max_pool_mb * 1024 * 1024)
+        self.input_scale = input_scale
+        self.input_offset = input_offset
+
+        self._free: Dict[Tuple[int, int], List[np.ndarray]] = defaultdict(list)
+        self._idle_bytes = 0
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+        self.bytes_copied = 0
+
+    def _bucket(self, height: int, width: int) -> Tuple[int, int]:
+        step = self.bucket_size
+        return (-(-height // step) * step, -(-width // step) * step)
+
+    def acquire(self, height: int, width: int) -> Tuple[np.ndarray, bool]:
+        """Get a buffer for an image of this size; returns (buffer, newly_allocated)"""
+        bucket = self._bucket(height, width)
+        with self._lock:
+            if self._free[bucket]:
+                buffer = self._free[bucket].pop()
+                self._idle_bytes -= buffer.nbytes
+                self.reuses += 1
+                record_input(allocated=False)
+                return buffer, False
+            self.allocations += 1
+        record_input(allocated=True)
+        return np.empty((MODEL_CHANNELS,) + bucket, dtype=np.float32), True
+
+    def allocate_batch(self, count: int, height: int, width: int) -> np.ndarray:
+        """Unpooled (count, 5, H, W) float32 batch for U-Net tiles, counted like pooled allocations"""
+        with self._lock:
+            self.allocations += 1
+        record_input(allocated=True)
+        return np.empty((count, MODEL_CHANNELS, height, width), dtype=np.float32)
+
+    def release(self, buffer: np.ndarray) -> None:
+        """Keep a buffer for reuse unless its bucket or the pool is full"""
+        bucket = buffer.shape[1:]
+        with self._lock:
+            if (len(self._free[bucket]) < self.max_per_bucket
+                    and self._idle_bytes + buffer.nbytes <= self.max_pool_bytes):
+                self._free[bucket].append(buffer)
+                self._idle_bytes += buffer.nbytes
+
+    def fill(self, out: np.ndarray, image_array: np.ndarray) -> int:
+        """
+        Write an (H, W[, C]) image into a (5, H, W) float32 array and normalize it in place
+
+        Shared by pooled full frames and U-Net tile batches, so both see the same input.
+
+        Returns:
+            Bytes written, also added to the pool and current request totals
+        """
+        source = image_array if image_array.ndim == 3 else image_array[..., None]
+        for target, src in enumerate(channel_map(source.shape[2])):
+            np.copyto(out[target], source[..., src], casting='unsafe')
+        if self.input_scale != 1.0:
+            out *= self.input_scale
+        if self.input_offset:
+            out -= self.input_offset
+        with self._lock:
+            self.bytes_copied += out.nbytes
+        record_input(bytes_copied=out.nbytes)
+        return out.nbytes
+
+    def prepare(self, image_array: np.ndarray) -> PreparedImage:
+        """
+        Write an (H, W[, C]) image into a pooled channel-first float32 buffer
+
+        Each model channel is converted from its source channel in a single
+        np.copyto, so there are no intermediate float, concatenated or
+        permuted copies. Padding beyond the image is zeroed.
+        """
+        height, width = image_array.shape[:2]
+        buffer, allocated = self.acquire(height, width)
+        bytes_copied = self.fill(buffer[:, :height, :width], image_array)
+        buffer[:, height:, :] = 0
+        buffer[:, :height, width:] = 0
+        return PreparedImage(self, buffer, height, width, allocated, bytes_copied)
+
+    def stats(self) -> Dict:
+        """Totals since startup"""
+        with self._lock:
+            return {
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "bytes_copied": self.bytes_copied,
+                "idle_mb": round(self._idle_bytes / (1024 * 1024), 1),
+            }
+
+
+# Global buffer pool shared by all model inputs
+buffer_pool = None
+
+def get_buffer_pool() -> BufferPool:
+    """Get buffer pool instance"""
+    global buffer_pool
+    if buffer_pool is None:
+        buffer_pool = BufferPool(
+            bucket_size=PREPROCESS_CONFIG["bucket_size"],
+            max_per_bucket=PREPROCESS_CONFIG["max_buffers_per_bucket"],
+            max_pool_mb=PREPROCESS_CONFIG["max_pool_mb"],
+            input_scale=PREPROCESS_CONFIG["input_scale"],
+            input_offset=PREPROCESS_CONFIG["input_offset"]
+        )
+    return buffer_pool
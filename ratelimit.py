@@ -0,0 +1,139 @@
+"""
+Per-chat rate limiting
+- Token bucket per (chat, category) with separate text, image and admin limits
+- Buckets live in an OrderedDict kept in last-use order, so idle chats expire
+  from the front in O(1) and the table stays bounded with 100k+ chats
+- Benchmark of the per-update overhead:
+    python ratelimit.py [updates] [chats]
+"""
+
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEXT = "text"
+IMAGE = "image"
+ADMIN = "admin"
+
+
+class RateLimiter:
+    """Token buckets for many chats in a bounded, self-expiring table"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], idle_ttl: float = 600,
+                 max_entries: int = 200000):
+        """
+        Initialize rate limiter
+
+        Args:
+            limits: Category -> (tokens refilled per second, bucket size)
+            idle_ttl: Seconds after which an untouched bucket is dropped
+                      (a dropped bucket comes back full, which an idle chat would have anyway)
+            max_entries: Hard cap on buckets; the least recently used are dropped first
+        """
+        self.limits = limits
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        # (chat_id, category) -> [tokens, last refill time, warned]
+        self._buckets: "OrderedDict[Tuple[int, str], list]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def _expire(self, now: float) -> None:
+        """Drop idle (or excess) buckets from the least recently used end; amortized O(1)"""
+        buckets = self._buckets
+        deadline = now - self.idle_ttl
+        while buckets:
+            if next(iter(buckets.values()))[1] > deadline and len(buckets) <= self.max_entries:
+                break
+            buckets.popitem(last=False)
+
+    def check(self, chat_id: int, category: str, now: Optional[float] = None) -> Tuple[bool, bool]:
+        """
+        Take a token for a chat
+
+        Returns:
+            (allowed, first_refusal) - first_refusal is True only for the first refused
+            request after an allowed one, so the chat is told to slow down once
+        """
+        now = time.monotonic() if now is None else now
+        rate, burst = self.limits[category]
+        key = (chat_id, category)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now, False]
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        self._expire(now)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            self.allowed += 1
+            return True, False
+        self.limited += 1
+        first_refusal = not bucket[2]
+        bucket[2] = True
+        return False, first_refusal
+
+    def allow(self, chat_id: int, category: str, now: Optional[float] = None) -> bool:
+        """Take a token for a chat; False when it is over its limit"""
+        return self.check(chat_id, category, now)[0]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def stats(self) -> Dict:
+        return {"buckets": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+def update_category(update, admin_commands: Iterable[str]) -> str:
+    """Rate-limit category of a Telegram update: admin command, image or text"""
+    message = getattr(update, "effective_message", None)
+    if message is None:
+        return TEXT
+    if message.photo or message.document:
+        return IMAGE
+    text = message.text or ""
+    if text.startswith("/"):
+        command = text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower() if len(text) > 1 else ""
+        if command in admin_commands:
+            return ADMIN
+    return TEXT
+
+
+def benchmark(updates: int = 1000000, chats: int = 150000) -> Dict:
+    """Time check() over random chats and report the per-update overhead and table size"""
+    import random
+
+    limiter = RateLimiter({TEXT: (1.0, 10), IMAGE: (0.1, 3), ADMIN: (1 / 30, 2)},
+                          idle_ttl=600, max_entries=200000)
+    categories = (TEXT, TEXT, TEXT, IMAGE, ADMIN)
+    rng = random.Random(0)
+    keys = [(rng.randrange(chats), categories[rng.randrange(5)]) for _ in range(updates)]
+
+    # Simulated clock: all updates spread over one hour
+    step = 3600 / updates
+    start = time.perf_counter()
+    now = 0.0
+    for chat_id, category in keys:
+        now += step
+        limiter.check(chat_id, category, now)
+    elapsed = time.perf_counter() - start
+    return {
+        "updates": updates,
+        "chats": chats,
+        "ns_per_update": round(elapsed / updates * 1e9),
+        "max_buckets": limiter.max_entries,
+        **limiter.stats(),
+    }
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    print(benchmark(*args))
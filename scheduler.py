@@ -0,0 +1,233 @@
+"""
+Scheduled field scans
+- Min-heap of next-due times per registered field
+- Jittered intervals so scans don't all fire at the same moment
+- Bounded concurrency and JSON state persisted across restarts
+- State writes coalesced and done off the event loop
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+class ScanScheduler:
+    """Tracks when each field is next due for a scan and runs due scans"""
+
+    def __init__(self, state_file: str = "scan_schedule.json", interval_days: float = 15,
+                 jitter: float = 0.1, max_concurrent: int = 2, semaphore: Optional[asyncio.Semaphore] = None,
+                 save_delay: float = 1.0):
+        """
+        Initialize scheduler
+
+        Args:
+            state_file: JSON file holding fields, due times and activity times
+            interval_days: Default days between scans of a field
+            jitter: Random spread applied to each interval, as a fraction of it
+            max_concurrent: Scans allowed to run at once (ignored when semaphore is given)
+            semaphore: Shared concurrency budget for all image analysis
+            save_delay: Seconds to wait after a change before writing, so bulk registrations
+                        and finished scans cost one write on a background thread
+        """
+        self.state_file = state_file
+        self.save_delay = save_delay
+        self.interval_days = interval_days
+        self.jitter = jitter
+        self.semaphore = semaphore or asyncio.Semaphore(max_concurrent)
+        self.fields: Dict[str, Dict] = {}
+        self.last_activity: Dict[str, float] = {}
+        self._heap: List[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._running: Dict[str, asyncio.Task] = {}
+        # Guards fields and activity times against the writer thread snapshotting mid-update;
+        # record_activity() is also called from analysis worker threads
+        self._lock = threading.RLock()
+        # Serializes writers so an older snapshot never lands after a newer one
+        self._write_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self.load()
+
+    def _jittered(self, interval_days: float) -> float:
+        """Interval in seconds with random jitter applied"""
+        spread = interval_days * self.jitter
+        return max(0.0, interval_days + random.uniform(-spread, spread)) * SECONDS_PER_DAY
+
+    def _push(self, field_id: str) -> None:
+        heapq.heappush(self._heap, (self.fields[field_id]["next_due"], field_id))
+        self._wakeup.set()
+
+    def add_field(self, field_id: str, chat_id: Optional[int] = None,
+                  interval_days: Optional[float] = None, **attributes) -> Dict:
+        """Register a field (or update it) and schedule its first scan"""
+        with self._lock:
+            field = self.fields.get(field_id, {"last_run": None})
+            # Re-registering without a day count keeps the field's own interval
+            interval = interval_days or field.get("interval_days", self.interval_days)
+            field.update(attributes)
+            field.update({"chat_id": chat_id, "interval_days": interval})
+            if "next_due" not in field or interval_days:
+                # First scan spread over the jitter window to avoid a stampede after bulk registration
+                field["next_due"] = time.time() + random.uniform(0, interval * self.jitter) * SECONDS_PER_DAY
+            self.fields[field_id] = field
+        self._push(field_id)
+        self.save()
+        return field
+
+    def remove_field(self, field_id: str) -> bool:
+        """Unregister a field; its stale heap entry is skipped lazily"""
+        with self._lock:
+            if self.fields.pop(field_id, None) is None:
+                return False
+        self.save()
+        return True
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return fields whose scan is due"""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_time, field_id = heapq.heappop(self._heap)
+            field = self.fields.get(field_id)
+            # Skip entries left behind by removed or rescheduled fields
+            if field is None or field["next_due"] != due_time or field_id in self._running:
+                continue
+            due.append(field_id)
+        return due
+
+    def next_due_in(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the earliest scheduled scan, or None when nothing is scheduled"""
+        now = time.time() if now is None else now
+        while self._heap:
+            due_time, field_id = self._heap[0]
+            field = self.fields.get(field_id)
+            if field is not None and field["next_due"] == due_time:
+                return max(0.0, due_time - now)
+            heapq.heappop(self._heap)
+        return None
+
+    def complete(self, field_id: str, now: Optional[float] = None) -> None:
+        """Record a finished scan and schedule the next one"""
+        field = self.fields.get(field_id)
+        if field is None:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            field["last_run"] = now
+            field["next_due"] = now + self._jittered(field["interval_days"])
+        self._push(field_id)
+        self.save()
+
+    def record_activity(self, kind: str, timestamp: Optional[float] = None) -> None:
+        """Record the time of the latest activity of a kind (e.g. 'weed_scan')"""
+        with self._lock:
+            self.last_activity[kind] = time.time() if timestamp is None else timestamp
+        self.save()
+
+    def last_run_ago(self, kind: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the latest activity of a kind, or None if it never ran"""
+        timestamp = self.last_activity.get(kind)
+        if timestamp is None:
+            return None
+        now = time.time() if now is None else now
+        return now - timestamp
+
+    def load(self) -> None:
+        """Load fields and activity times from the state file"""
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Error loading scan schedule: {e}")
+            return
+
+        self.fields = state.get("fields", {})
+        self.last_activity = state.get("last_activity", {})
+        self._heap = [(field["next_due"], field_id) for field_id, field in self.fields.items()]
+        heapq.heapify(self._heap)
+
+    def save(self) -> None:
+        """Mark the state dirty and schedule a coalesced write after save_delay"""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self) -> None:
+        """Atomically write fields and activity times to the state file"""
+        with self._write_lock:
+            self._write()
+
+    def _write(self) -> None:
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+            if not self._dirty:
+                return
+            self._dirty = False
+            state = {"fields": {field_id: dict(field) for field_id, field in self.fields.items()},
+                     "last_activity": dict(self.last_activity)}
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.error(f"Error saving scan schedule: {e}")
+
+    async def _run_scan(self, field_id: str, scan: Callable[[str, Dict], Awaitable[None]]) -> None:
+        try:
+            async with self.semaphore:
+                await scan(field_id, self.fields[field_id])
+        except asyncio.CancelledError:
+            # Shutting down: leave the scan due so it runs after restart
+            self._running.pop(field_id, None)
+            raise
+        except Exception as e:
+            logger.error(f"Scheduled scan failed for {field_id}: {e}")
+
+        self._running.pop(field_id, None)
+        # Reschedule even on failure so one bad field can't spin the loop
+        self.complete(field_id)
+
+    async def run(self, scan: Callable[[str, Dict], Awaitable[None]], max_sleep: float = 300) -> None:
+        """
+        Run due scans until cancelled
+
+        Args:
+            scan: Coroutine called as scan(field_id, field) for each due field
+            max_sleep: Upper bound on seconds between checks of the heap
+        """
+        logger.info(f"Scan scheduler started with {len(self.fields)} fields")
+        try:
+            while True:
+                for field_id in self.pop_due():
+                    self._running[field_id] = asyncio.create_task(self._run_scan(field_id, scan))
+
+                wait = self.next_due_in()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait if wait is not None else max_sleep, max_sleep))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in self._running.values():
+                task.cancel()
+            # Shutting down: write pending changes now rather than on the timer
+            await asyncio.to_thread(self.flush)
@@ -0,0 +1,318 @@
+"""
+Targeted alert subscriptions
+- Inverted index from (field, alert type) to subscribed chat IDs
+- Wildcard subscriptions for all fields and/or all alert types
+- Region subscriptions by polygon, resolved against known field locations
+- Writes coalesced and persisted atomically off the event loop
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANY = "*"  # wildcard field or alert type
+
+Point = Tuple[float, float]  # (lat, lon)
+
+
+def point_in_polygon(point: Point, polygon: Sequence[Point]) -> bool:
+    """Ray-casting test for a (lat, lon) point against a polygon of (lat, lon) vertices"""
+    lat, lon = point
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lon_i > lon) != (lon_j > lon):
+            crossing = lat_i + (lon - lon_i) * (lat_j - lat_i) / (lon_j - lon_i)
+            if lat < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+def bounding_box(polygon: Sequence[Point]) -> Tuple[float, float, float, float]:
+    lats = [p[0] for p in polygon]
+    lons = [p[1] for p in polygon]
+    return (min(lats), min(lons), max(lats), max(lons))
+
+
+class SubscriptionIndex:
+    """Who receives which alerts, keyed so fan-out only touches matching chats"""
+
+    def __init__(self, state_file: str = "subscriptions.json", legacy_file: Optional[str] = None,
+                 save_delay: float = 1.0):
+        """
+        Initialize subscription index
+
+        Args:
+            state_file: JSON file holding subscriptions, regions and field locations
+            legacy_file: Old one-chat-ID-per-line subscriber list, imported as
+                         all-fields/all-alerts subscriptions when no state file exists
+            save_delay: Seconds to wait after a change before writing, so a burst
+                        of commands costs one write on a background thread
+        """
+        self.state_file = state_file
+        self.save_delay = save_delay
+        # Guards the index against the writer thread snapshotting mid-update
+        self._lock = threading.RLock()
+        # Serializes writers so an older snapshot never lands after a newer one
+        self._write_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._index: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        self._by_chat: Dict[int, Set[Tuple[str, str]]] = defaultdict(set)
+        self.regions: Dict[str, Dict] = {}
+        self.field_locations: Dict[str, Point] = {}
+        self.load(legacy_file)
+
+    # Index maintenance (no persistence)
+
+    def _add(self, chat_id: int, field_id: str, alert_type: str) -> bool:
+        key = (field_id, alert_type)
+        if chat_id in self._index[key]:
+            return False
+        self._index[key].add(chat_id)
+        self._by_chat[chat_id].add(key)
+        return True
+
+    def _discard(self, chat_id: int, field_id: str, alert_type: str) -> bool:
+        key = (field_id, alert_type)
+        chats = self._index.get(key)
+        if not chats or chat_id not in chats:
+            return False
+        chats.discard(chat_id)
+        if not chats:
+            del self._index[key]
+        keys = self._by_chat[chat_id]
+        keys.discard(key)
+        if not keys:
+            del self._by_chat[chat_id]
+        return True
+
+    def _region_fields(self, polygon: Sequence[Point]) -> List[str]:
+        """Known fields whose location lies inside the polygon"""
+        south, west, north, east = bounding_box(polygon)
+        return [field_id for field_id, (lat, lon) in self.field_locations.items()
+                if south <= lat <= north and west <= lon <= east
+                and point_in_polygon((lat, lon), polygon)]
+
+    # Public API
+
+    def subscribe(self, chat_id: int, field_id: str = ANY, alert_type: str = ANY) -> bool:
+        """Subscribe a chat to one field and alert type (ANY for all)"""
+        with self._lock:
+            added = self._add(chat_id, field_id, alert_type)
+        if added:
+            self.save()
+        return added
+
+    def unsubscribe(self, chat_id: int, field_id: Optional[str] = None,
+                    alert_type: Optional[str] = None) -> int:
+        """
+        Remove a chat's subscriptions; None matches any field or alert type
+
+        Returns:
+            Number of subscriptions removed (region subscriptions included when field_id is None)
+        """
+        with self._lock:
+            keys = [key for key in self._by_chat.get(chat_id, ())
+                    if (field_id is None or key[0] == field_id)
+                    and (alert_type is None or key[1] == alert_type)]
+            for key in keys:
+                self._discard(chat_id, *key)
+            removed = len(keys)
+            if field_id is None:
+                for name in [name for name, region in self.regions.items()
+                             if region["chat_id"] == chat_id
+                             and (alert_type is None or region["alert_type"] == alert_type)]:
+                    del self.regions[name]
+                    removed += 1
+        if removed:
+            self.save()
+        return removed
+
+    def bulk_update(self, changes: Iterable[Tuple[str, int, str, str]]) -> Dict[str, int]:
+        """
+        Apply many subscription changes with one write
+
+        Args:
+            changes: (op, chat_id, field_id, alert_type) tuples, op is "add" or "remove"
+
+        Returns:
+            dict with counts of added, removed and unchanged entries
+        """
+        counts = {"added": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            for op, chat_id, field_id, alert_type in changes:
+                if op == "add":
+                    changed, kind = self._add(chat_id, field_id, alert_type), "added"
+                elif op == "remove":
+                    changed, kind = self._discard(chat_id, field_id, alert_type), "removed"
+                else:
+                    raise ValueError(f"Unknown subscription op {op!r}")
+                counts[kind if changed else "unchanged"] += 1
+        if counts["added"] or counts["removed"]:
+            self.save()
+        return counts
+
+    def subscribe_region(self, chat_id: int, name: str, polygon: Sequence[Point],
+                         alert_type: str = ANY) -> List[str]:
+        """
+        Subscribe a chat to every field inside a (lat, lon) polygon
+
+        Fields located later are matched against the region as they are added.
+        Redefining an existing region drops the subscriptions its old polygon
+        added, except for fields another region of the same chat still covers.
+
+        Returns:
+            Fields currently inside the region
+        """
+        if len(polygon) < 3:
+            raise ValueError("A region needs at least 3 vertices")
+        polygon = [(float(lat), float(lon)) for lat, lon in polygon]
+        with self._lock:
+            old = self.regions.pop(name, None)
+            if old is not None:
+                self._drop_region_fields(old)
+            self.regions[name] = {"chat_id": chat_id, "alert_type": alert_type, "polygon": polygon}
+            fields = self._region_fields(polygon)
+            for field_id in fields:
+                self._add(chat_id, field_id, alert_type)
+        self.save()
+        return fields
+
+    def _drop_region_fields(self, region: Dict) -> None:
+        """Remove the field subscriptions a region added, unless another region keeps them"""
+        kept: Set[str] = set()
+        for other in self.regions.values():
+            if other["chat_id"] == region["chat_id"] and other["alert_type"] == region["alert_type"]:
+                kept.update(self._region_fields(other["polygon"]))
+        for field_id in self._region_fields(region["polygon"]):
+            if field_id not in kept:
+                self._discard(region["chat_id"], field_id, region["alert_type"])
+
+    def locate_field(self, field_id: str, lat: float, lon: float) -> List[int]:
+        """
+        Set a field's location and subscribe owners of regions containing it
+
+        Returns:
+            Chats newly subscribed through their regions
+        """
+        added = []
+        with self._lock:
+            self.field_locations[field_id] = (float(lat), float(lon))
+            for region in self.regions.values():
+                south, west, north, east = bounding_box(region["polygon"])
+                if (south <= lat <= north and west <= lon <= east
+                        and point_in_polygon((lat, lon), region["polygon"])
+                        and self._add(region["chat_id"], field_id, region["alert_type"])):
+                    added.append(region["chat_id"])
+        self.save()
+        return added
+
+    def recipients(self, field_id: Optional[str] = None, alert_type: str = ANY) -> Set[int]:
+        """
+        Chats that should receive an alert
+
+        Looks up at most four index keys (exact, any field, any type, everything),
+        so the cost is proportional to the matching chats only.
+        """
+        fields = (field_id, ANY) if field_id and field_id != ANY else (ANY,)
+        types = (alert_type, ANY) if alert_type != ANY else (ANY,)
+        chats: Set[int] = set()
+        for field in fields:
+            for kind in types:
+                chats |= self._index.get((field, kind), set())
+        return chats
+
+    def subscriptions(self, chat_id: int) -> List[Tuple[str, str]]:
+        """(field, alert type) pairs a chat is subscribed to"""
+        return sorted(self._by_chat.get(chat_id, ()))
+
+    def is_subscribed(self, chat_id: int) -> bool:
+        return chat_id in self._by_chat
+
+    def __len__(self) -> int:
+        """Number of subscribed chats"""
+        return len(self._by_chat)
+
+    def load(self, legacy_file: Optional[str] = None) -> None:
+        """Load subscriptions from the state file (or import the legacy subscriber list)"""
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            self._import_legacy(legacy_file)
+            return
+        except Exception as e:
+            logger.error(f"Error loading subscriptions: {e}")
+            return
+
+        for field_id, alert_type, chat_ids in state.get("subscriptions", []):
+            for chat_id in chat_ids:
+                self._add(chat_id, field_id, alert_type)
+        self.regions = state.get("regions", {})
+        for region in self.regions.values():
+            region["polygon"] = [tuple(point) for point in region["polygon"]]
+        self.field_locations = {field_id: tuple(point)
+                                for field_id, point in state.get("field_locations", {}).items()}
+
+    def _import_legacy(self, legacy_file: Optional[str]) -> None:
+        if not legacy_file:
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                chat_ids = [int(line.strip()) for line in f if line.strip()]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Error importing subscribers: {e}")
+            return
+        for chat_id in chat_ids:
+            self._add(chat_id, ANY, ANY)
+        if chat_ids:
+            logger.info(f"Imported {len(chat_ids)} subscribers from {legacy_file}")
+            self.save()
+
+    def save(self) -> None:
+        """Mark the state dirty and schedule a coalesced write after save_delay"""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self) -> None:
+        """Atomically write subscriptions, regions and field locations to the state file"""
+        with self._write_lock:
+            self._write()
+
+    def _write(self) -> None:
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+            if not self._dirty:
+                return
+            self._dirty = False
+            state = {
+                "subscriptions": [[field_id, alert_type, sorted(chats)]
+                                  for (field_id, alert_type), chats in self._index.items()],
+                "regions": {name: dict(region) for name, region in self.regions.items()},
+                "field_locations": dict(self.field_locations),
+            }
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.error(f"Error saving subscriptions: {e}")
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def smooth_noise():
+    """Factory for random fields box-blurred along both axes, scaled to 0-1 (NumPy only)"""
+
+    def make(shape, seed=0, radius=4):
+        noise = np.random.default_rng(seed).random(shape)
+        for axis in (0, 1):
+            padded = np.cumsum(np.insert(noise, 0, 0, axis=axis), axis=axis)
+            noise = (np.take(padded, range(2 * radius, noise.shape[axis] + 1), axis=axis)
+                     - np.take(padded, range(0, noise.shape[axis] + 1 - 2 * radius), axis=axis)) / (2 * radius)
+        return (noise - noise.min()) / (noise.max() - noise.min())
+
+    return make
@@ -0,0 +1,110 @@
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from change_detection import FieldScanCache, IncrementalAnalyzer
+from models import UNet, UNetWeedDetector
+
+TILE = 128
+
+
+@pytest.fixture(scope="module")
+def scene(smooth_noise):
+    return (smooth_noise((400, 520, 5)) * 255).astype(np.uint8)
+
+
+@pytest.fixture(scope="module")
+def detector(tmp_path_factory):
+    detector = UNetWeedDetector(model_path=str(tmp_path_factory.mktemp("models") / "missing.pth"))
+    torch.manual_seed(0)
+    detector.model = UNet(in_channels=5, out_channels=1).eval()
+    detector.loaded = True
+    return detector
+
+
+class SpyDetector:
+    """Passes calls through to the detector and records which regions were segmented"""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.full_frames = 0
+        self.tile_boxes = []
+
+    def predict(self, image_array):
+        self.full_frames += 1
+        return self.detector.predict(image_array)
+
+    def segment_tiles(self, image_array, boxes):
+        self.tile_boxes.extend(boxes)
+        return self.detector.segment_tiles(image_array, boxes)
+
+    def _summarize_mask(self, mask):
+        return self.detector._summarize_mask(mask)
+
+
+def _frame(scene, dy=0, dx=0):
+    return np.ascontiguousarray(scene[32 + dy:32 + dy + 2 * TILE, 64 + dx:64 + dx + 3 * TILE])
+
+
+def test_shifted_repeat_reruns_only_changed_tiles(tmp_path, scene, detector):
+    analyzer = IncrementalAnalyzer(str(tmp_path), tile_size=TILE)
+    spy = SpyDetector(detector)
+    first = analyzer.analyze("A", _frame(scene), spy)
+    assert first["incremental"]["mode"] == "full"
+
+    repeat = _frame(scene, dy=8, dx=-12).copy()
+    # Something new in the middle of the top-centre tile (in the first frame's coordinates)
+    repeat[40 - 8:90 - 8, TILE + 30 + 12:TILE + 90 + 12] = 255
+    results = analyzer.analyze("A", repeat, spy)
+
+    assert results["incremental"]["mode"] == "incremental"
+    assert results["incremental"]["shift"] == (-8, 12)
+    assert spy.full_frames == 1
+    assert spy.tile_boxes == [(0, TILE, TILE, 2 * TILE)]
+    assert results["incremental"]["tiles_recomputed"] == 1
+    assert results["incremental"]["tiles_total"] == 6
+
+
+@pytest.mark.parametrize("change, reason", [
+    (lambda frame: frame[:, :-TILE], "frame size changed"),
+    (lambda frame: frame.astype(np.uint16) * 257, "pixel type changed"),
+])
+def test_size_or_dtype_change_forces_full_scan(tmp_path, scene, detector, change, reason):
+    analyzer = IncrementalAnalyzer(str(tmp_path), tile_size=TILE)
+    spy = SpyDetector(detector)
+    analyzer.analyze("A", _frame(scene), spy)
+
+    results = analyzer.analyze("A", np.ascontiguousarray(change(_frame(scene))), spy)
+
+    assert results["incremental"]["mode"] == "full"
+    assert results["incremental"]["reason"] == reason
+    assert spy.full_frames == 2
+    assert spy.tile_boxes == []
+
+
+def test_saved_cache_reloads_with_identical_results(tmp_path, scene, detector):
+    in_memory = IncrementalAnalyzer(str(tmp_path), tile_size=TILE)
+    in_memory.analyze("A", _frame(scene), detector)
+    cache = in_memory._caches["A"]
+    reloaded_cache = FieldScanCache.load(in_memory._cache_path("A"))
+    assert reloaded_cache.shape == cache.shape and reloaded_cache.dtype == cache.dtype
+    assert np.array_equal(reloaded_cache.mask, cache.mask)
+    assert np.array_equal(reloaded_cache.index_means, cache.index_means)
+    assert reloaded_cache.heads == cache.heads
+
+    # A fresh analyzer (e.g. after a restart) reads the cache from disk
+    (tmp_path / "restarted").mkdir()
+    shutil.copy(in_memory._cache_path("A"), tmp_path / "restarted")
+    restarted = IncrementalAnalyzer(str(tmp_path / "restarted"), tile_size=TILE)
+
+    repeat = _frame(scene).copy()
+    repeat[10:60, 10:60] = 0
+    from_memory = in_memory.analyze("A", repeat, detector)
+    from_disk = restarted.analyze("A", repeat, detector)
+
+    assert from_memory["incremental"]["mode"] == from_disk["incremental"]["mode"] == "incremental"
+    assert from_memory["incremental"]["tiles_recomputed"] == 1
+    assert from_memory["index_means"] == from_disk["index_means"]
+    assert np.array_equal(from_memory["segmentation_mask"], from_disk["segmentation_mask"])
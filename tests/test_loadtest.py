@@ -0,0 +1,59 @@
+import copy
+
+import pytest
+
+from loadtest import LoadTest, compare_reports, synthesize_trace
+
+
+def _report(**summary):
+    base = {"updates": 100, "answered": 100, "dropped": 0, "throughput_per_s": 10.0, "backlog_max": 4,
+            "latency_ms": {"p50": 50.0, "p95": 200.0, "p99": 400.0}, "rss_max_mb": 300.0}
+    base.update(summary)
+    return {"speedup": 10, "api_latency": 0.0, "git_commit": None, "summary": base}
+
+
+def test_compare_reports_flags_regressions_beyond_tolerance():
+    baseline = _report()
+    noisy = _report(backlog_max=5, latency_ms={"p50": 55.0, "p95": 210.0, "p99": 420.0})
+    slower = _report(dropped=2, throughput_per_s=8.0, rss_max_mb=310.0,
+                     latency_ms={"p50": 51.0, "p95": 300.0, "p99": 400.0})
+
+    result = compare_reports([baseline, noisy, slower], ["base", "noisy", "slower"])
+
+    flagged = {(r["run"], r["metric"]) for r in result["regressions"]}
+    assert flagged == {("slower", "latency_ms.p95"), ("slower", "throughput_per_s"), ("slower", "dropped")}
+    assert "3 regression(s) against base" in result["markdown"]
+    assert "| throughput_per_s | 10 | 10 (+0%) | 8 (-20%) ❌ |" in result["markdown"]
+
+
+def test_compare_reports_accepts_improvements():
+    baseline = _report()
+    faster = copy.deepcopy(baseline)
+    faster["summary"].update(throughput_per_s=20.0, latency_ms={"p50": 20.0, "p95": 80.0, "p99": 150.0})
+
+    result = compare_reports([baseline, faster], ["base", "faster"])
+
+    assert result["regressions"] == []
+    assert "No regressions against base" in result["markdown"]
+
+
+def test_replayed_trace_counts_answers_drops_and_rate_limits(tmp_path):
+    events = synthesize_trace(minutes=1, chats=3, queries_per_chat=2, photos_per_chat=0.5, alerts=1,
+                              image_size="320x240", seed=3)
+    # One chat fires more questions at once than its text burst allows (10): the 11th gets
+    # the rate-limit notice, the 12th is dropped silently, and neither is answered
+    burst_start = events[-1]["t"] + 1
+    events += [{"t": burst_start, "chat_id": 2001, "kind": "text", "text": "How is my crop health?"}
+               for _ in range(12)]
+
+    load_test = LoadTest(events, speedup=20, drain_timeout=5, workdir=str(tmp_path))
+    summary = load_test.run()["summary"]
+
+    assert summary["updates"] == len(events)
+    assert summary["answered"] == len(events) - 2
+    assert summary["dropped"] == 2
+    assert summary["rate_limited"] == 1
+    assert summary["unmatched_replies"] == 0
+    # The drain wait for the two dropped updates is not counted against throughput
+    assert summary["busy_seconds"] < summary["seconds"] - 4
+    assert summary["throughput_per_s"] == pytest.approx(summary["answered"] / summary["busy_seconds"], rel=0.02)
@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+import pytest
+
+from mosaic import FieldMosaic, MosaicStore, RegistrationFailed
+
+HEIGHT, WIDTH = 240, 320
+
+
+@pytest.fixture(scope="module")
+def scene(smooth_noise):
+    return smooth_noise((1000, 1200, 3), radius=3)
+
+
+def _frame(scene, y, x, dtype=np.uint8):
+    return (scene[y:y + HEIGHT, x:x + WIDTH] * np.iinfo(dtype).max).astype(dtype)
+
+
+@pytest.mark.parametrize("shift", [(15, WIDTH // 2), (-15, WIDTH // 2), (HEIGHT // 2, 0),
+                                   (5, -WIDTH // 2), (3, WIDTH // 2 + 8)])
+def test_half_frame_shifts_register_in_the_right_direction(tmp_path, scene, shift):
+    mosaic = FieldMosaic(str(tmp_path))
+    mosaic.add_frame(_frame(scene, 300, 400))
+    frame = mosaic.add_frame(_frame(scene, 300 + shift[0], 400 + shift[1]))
+    assert frame["offset"] == shift
+
+
+def test_frame_without_overlap_is_rejected(tmp_path, scene):
+    mosaic = FieldMosaic(str(tmp_path))
+    mosaic.add_frame(_frame(scene, 0, 0))
+    with pytest.raises(RegistrationFailed):
+        mosaic.add_frame(_frame(scene, 600, 800))
+    assert mosaic.stats()["frames"] == 1
+
+
+def test_image_layer_keeps_the_source_dtype(tmp_path, scene):
+    mosaic = FieldMosaic(str(tmp_path))
+    first = _frame(scene, 300, 400, np.uint16)
+    mosaic.add_frame(first)
+    mosaic.add_frame(_frame(scene, 300, 400 + WIDTH // 3, np.uint16))
+    mosaic.close()
+
+    reopened = FieldMosaic(str(tmp_path))
+    window = reopened.read(0, 0, HEIGHT, WIDTH // 3)
+    assert window.dtype == np.uint16
+    assert np.array_equal(window, first[:, :WIDTH // 3])
+    with pytest.raises(ValueError):
+        reopened.add_frame(_frame(scene, 300, 400))
+
+
+def test_store_opens_one_mosaic_per_field_across_threads(tmp_path):
+    store = MosaicStore(str(tmp_path))
+    barrier = threading.Barrier(8)
+    opened = []
+
+    def get():
+        barrier.wait()
+        opened.append(store.get("North Plot"))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(mosaic) for mosaic in opened}) == 1
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+from telegram import Bot
+from telegram.error import BadRequest
+
+from config import NETWORK_CONFIG
+from fake_bot_api import FakeBotAPI
+from network import DownloadTooLarge, FileDownloader, api_urls, build_send_request
+
+
+@pytest.fixture
+def api():
+    server = FakeBotAPI(port=0).start()
+    yield server
+    server.stop()
+
+
+async def _download_all(api, file_ids, **downloader_kwargs):
+    bot = Bot("123:fake", request=build_send_request(NETWORK_CONFIG), **api_urls(api.base_url))
+    downloader = FileDownloader(**downloader_kwargs)
+    try:
+        async with bot:
+            return await asyncio.gather(*(downloader.download(bot, file_id) for file_id in file_ids))
+    finally:
+        await downloader.close()
+
+
+def test_parallel_downloads_are_byte_identical(api):
+    payloads = {f"photo{i}": os.urandom(256 * 1024 + i) for i in range(12)}
+    for file_id, data in payloads.items():
+        api.add_file(file_id, data)
+
+    results = asyncio.run(_download_all(api, list(payloads), pool_size=4, max_parallel=4, chunk_size=4096))
+
+    assert [out.getvalue() for out in results] == list(payloads.values())
+
+
+def test_file_over_limit_is_refused(api):
+    api.add_file("big", os.urandom(200_000))
+
+    with pytest.raises(DownloadTooLarge):
+        asyncio.run(_download_all(api, ["big"], max_bytes=100_000))
+
+
+def test_unknown_file_id_is_an_error(api):
+    with pytest.raises(BadRequest, match="invalid file_id"):
+        asyncio.run(_download_all(api, ["missing"]))
+
+
+def test_missing_file_body_is_an_error(api, monkeypatch):
+    api.add_file("gone", b"data")
+    resolve = api._call
+
+    def call(method, params):
+        result = resolve(method, params)
+        if method == "getFile":
+            # Resolved, but the file disappears before the download starts
+            del api.files[params["file_id"]]
+        return result
+
+    monkeypatch.setattr(api, "_call", call)
+    with pytest.raises(httpx.HTTPStatusError) as excinfo:
+        asyncio.run(_download_all(api, ["gone"]))
+    assert excinfo.value.response.status_code == 404
+
+
+def test_max_parallel_bounds_concurrency():
+    latency, files = 0.25, 6
+    with_latency = FakeBotAPI(port=0, latency=latency).start()
+    try:
+        for i in range(files):
+            with_latency.add_file(f"photo{i}", b"x" * 1024)
+        file_ids = [f"photo{i}" for i in range(files)]
+
+        def timed(max_parallel):
+            start = time.perf_counter()
+            asyncio.run(_download_all(with_latency, file_ids, pool_size=files, max_parallel=max_parallel))
+            return time.perf_counter() - start
+
+        bounded = timed(2)
+        unbounded = timed(files)
+    finally:
+        with_latency.stop()
+
+    # getFile calls overlap; bodies go through in files / max_parallel waves
+    assert bounded >= latency * (1 + files / 2)
+    assert unbounded < latency * (1 + files / 2)
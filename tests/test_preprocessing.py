@@ -0,0 +1,39 @@
+import asyncio
+
+import numpy as np
+
+from memory_budget import MemoryGuard
+from preprocessing import BufferPool, channel_map
+
+
+def test_channel_map_repeats_source_channels():
+    assert channel_map(3) == [0, 1, 2, 0, 1]
+    assert channel_map(1) == [0, 0, 0, 0, 0]
+    assert channel_map(5) == [0, 1, 2, 3, 4]
+
+
+def test_allocations_and_copies_are_counted_per_request():
+    pool = BufferPool(bucket_size=32)
+    image = np.full((50, 70, 3), 7, dtype=np.uint8)
+
+    def work():
+        pool.prepare(image).release()
+        prepared = pool.prepare(image)
+        pool.fill(pool.allocate_batch(2, 32, 32)[0], image[:32, :32])
+        return prepared
+
+    async def scenario():
+        async with MemoryGuard().request("test") as usage:
+            prepared = await asyncio.to_thread(work)
+        return prepared, usage
+
+    prepared, usage = asyncio.run(scenario())
+
+    assert prepared.buffer.shape == (5, 64, 96)
+    assert np.array_equal(prepared.buffer[:, :50, :70], np.full((5, 50, 70), 7, np.float32))
+    assert not prepared.buffer[:, 50:].any() and not prepared.buffer[:, :, 70:].any()
+    frame_bytes = 5 * 50 * 70 * 4
+    assert prepared.stats() == {"buffer": "reused", "bucket": (64, 96), "bytes_copied": frame_bytes}
+    assert usage.summary()["input_buffers"] == {"allocations": 2, "reuses": 1,
+                                                "bytes_copied": 2 * frame_bytes + 5 * 32 * 32 * 4}
+    assert pool.stats()["bytes_copied"] == usage.input_buffers["bytes_copied"]
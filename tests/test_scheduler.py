@@ -0,0 +1,60 @@
+import asyncio
+import json
+import threading
+
+from scheduler import ScanScheduler
+
+
+def test_reregistering_keeps_the_field_interval(tmp_path):
+    scheduler = ScanScheduler(str(tmp_path / "schedule.json"), interval_days=15, save_delay=60)
+    first = dict(scheduler.add_field("A", chat_id=7, interval_days=3))
+
+    field = scheduler.add_field("A", chat_id=7, location=[1.0, 2.0])
+
+    assert field["interval_days"] == 3
+    assert field["next_due"] == first["next_due"]
+    assert field["location"] == [1.0, 2.0]
+
+
+def test_writes_are_coalesced_and_flushed(tmp_path):
+    state_file = tmp_path / "schedule.json"
+    scheduler = ScanScheduler(str(state_file), save_delay=60)
+    for i in range(100):
+        scheduler.add_field(f"field{i}", chat_id=i)
+    assert not state_file.exists()
+
+    scheduler.flush()
+    assert len(json.loads(state_file.read_text())["fields"]) == 100
+    assert len(ScanScheduler(str(state_file)).fields) == 100
+
+
+def test_activity_from_worker_threads_is_persisted(tmp_path):
+    state_file = tmp_path / "schedule.json"
+    scheduler = ScanScheduler(str(state_file), save_delay=0.01)
+    threads = [threading.Thread(target=scheduler.record_activity, args=(f"kind{i}", float(i)))
+               for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    scheduler.flush()
+    assert ScanScheduler(str(state_file)).last_activity == {f"kind{i}": float(i) for i in range(20)}
+
+
+def test_run_flushes_on_cancel(tmp_path):
+    state_file = tmp_path / "schedule.json"
+
+    async def scenario():
+        scheduler = ScanScheduler(str(state_file), save_delay=60)
+        task = asyncio.create_task(scheduler.run(lambda field_id, field: asyncio.sleep(0)))
+        scheduler.add_field("A", chat_id=1, interval_days=2)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert json.loads(state_file.read_text())["fields"]["A"]["interval_days"] == 2
@@ -0,0 +1,44 @@
+import json
+import time
+
+from subscriptions import ANY, SubscriptionIndex
+
+
+def test_writes_are_coalesced_and_flushed(tmp_path):
+    state_file = tmp_path / "subscriptions.json"
+    index = SubscriptionIndex(str(state_file), save_delay=60)
+    for chat_id in range(50):
+        index.subscribe(chat_id, "field_a", "disease")
+    assert not state_file.exists()
+
+    index.flush()
+    state = json.loads(state_file.read_text())
+    assert state["subscriptions"] == [["field_a", "disease", list(range(50))]]
+    assert SubscriptionIndex(str(state_file)).recipients("field_a", "disease") == set(range(50))
+
+
+def test_delayed_save_runs_in_background(tmp_path):
+    state_file = tmp_path / "subscriptions.json"
+    index = SubscriptionIndex(str(state_file), save_delay=0.05)
+    index.subscribe(1)
+    deadline = time.monotonic() + 5
+    while not state_file.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert SubscriptionIndex(str(state_file)).recipients("field_a") == {1}
+
+
+def test_redefined_region_drops_old_fields(tmp_path):
+    index = SubscriptionIndex(str(tmp_path / "subscriptions.json"), save_delay=60)
+    index.locate_field("west", 10.0, 10.0)
+    index.locate_field("east", 10.0, 20.0)
+    square = lambda lon: [(9, lon - 1), (9, lon + 1), (11, lon + 1), (11, lon - 1)]
+
+    assert index.subscribe_region(7, "7:farm", square(10)) == ["west"]
+    assert index.subscribe_region(7, "7:farm", square(20)) == ["east"]
+    assert index.recipients("west") == set()
+    assert index.recipients("east") == {7}
+
+    # A field still covered by another of the chat's regions stays subscribed
+    index.subscribe_region(7, "7:other", square(20))
+    index.subscribe_region(7, "7:farm", square(10))
+    assert index.subscriptions(7) == [("east", ANY), ("west", ANY)]
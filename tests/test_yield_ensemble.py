@@ -0,0 +1,49 @@
+"""Parity of the flat tree ensemble with scikit-learn reference models"""
+
+import numpy as np
+import pytest
+
+sklearn_ensemble = pytest.importorskip("sklearn.ensemble")
+
+from yield_ensemble import FlatTreeEnsemble, YieldEnsemble, check_parity
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.random((400, 5)).astype(np.float32)
+    y = 3 + 4 * X[:, 0] - 2 * X[:, 1] * X[:, 2] + rng.normal(0, 0.1, len(X))
+    X_test = rng.random((300, 5)).astype(np.float32)
+    return X, y, X_test
+
+
+@pytest.mark.parametrize("model", [
+    sklearn_ensemble.RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0),
+    sklearn_ensemble.RandomForestRegressor(n_estimators=10, random_state=0),
+    sklearn_ensemble.GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=0),
+    sklearn_ensemble.GradientBoostingRegressor(n_estimators=30, init="zero", random_state=0),
+    sklearn_ensemble.GradientBoostingRegressor(n_estimators=30, loss="huber", random_state=0),
+], ids=["rf-depth8", "rf-full", "gb", "gb-init-zero", "gb-huber"])
+def test_predict_matches_sklearn(data, model):
+    X, y, X_test = data
+    model.fit(X, y)
+    flat = FlatTreeEnsemble.from_sklearn(model)
+    assert check_parity(flat, model, X_test) < 1e-9
+    np.testing.assert_allclose(flat.predict(X_test[:1]), model.predict(X_test[:1]), atol=1e-9)
+
+
+def test_save_load_roundtrip(data, tmp_path):
+    X, y, X_test = data
+    forest = sklearn_ensemble.RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0).fit(X, y)
+    boosting = sklearn_ensemble.GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X, y)
+    ensemble = YieldEnsemble.from_sklearn(forest, boosting, forest_weight=0.3)
+    path = tmp_path / "yield_ensemble.npz"
+    ensemble.save(str(path))
+    loaded = YieldEnsemble.load(str(path))
+
+    predicted, confidence = ensemble.predict(X_test)
+    loaded_predicted, loaded_confidence = loaded.predict(X_test)
+    np.testing.assert_array_equal(predicted, loaded_predicted)
+    np.testing.assert_array_equal(confidence, loaded_confidence)
+    expected = 0.3 * forest.predict(X_test) + 0.7 * boosting.predict(X_test)
+    np.testing.assert_allclose(predicted, expected, atol=1e-9)
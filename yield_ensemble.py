@@ -0,0 +1,247 @@
+"""
+Array-backed tree ensemble for yield prediction
+- Random Forest + Gradient Boosting models flattened into NumPy node arrays
+- Vectorized evaluation over batches of feature rows (no per-node Python objects)
+"""
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Feature order expected by trained yield models
+YIELD_FEATURES = ["ndvi", "ndre", "gndvi", "health_score", "weed_coverage"]
+
+
+class FlatTreeEnsemble:
+    """Additive tree ensemble stored as flat arrays of nodes
+
+    Every tree's nodes live in the same arrays; ``roots`` holds the index of
+    each tree's root. Leaves point to themselves so a fixed number of
+    descent steps lands every row on its leaf.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots,
+                 tree_weight=1.0, base_score=0.0):
+        """
+        Args:
+            feature: Split feature index per node (int32)
+            threshold: Split threshold per node; rows with x <= threshold go left
+            left, right: Child node indices per node (leaves point to themselves)
+            value: Leaf value per node
+            roots: Root node index of each tree
+            tree_weight: Multiplier applied to every tree's output
+            base_score: Constant added to the weighted sum of trees
+        """
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.tree_weight = float(tree_weight)
+        self.base_score = float(base_score)
+        # Interleaved (left, right) children so one gather picks the next node
+        self._children = np.ascontiguousarray(np.stack([self.left, self.right], axis=1).ravel())
+        self.max_depth = self._compute_max_depth()
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _compute_max_depth(self) -> int:
+        """Number of descent steps needed to reach the deepest leaf"""
+        depth = 0
+        frontier = self.roots
+        is_leaf = self.left == np.arange(len(self.left))
+        while len(frontier):
+            frontier = frontier[~is_leaf[frontier]]
+            if len(frontier):
+                depth += 1
+                frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+        return depth
+
+    @classmethod
+    def from_sklearn(cls, model) -> "FlatTreeEnsemble":
+        """Flatten a fitted RandomForestRegressor or GradientBoostingRegressor"""
+        estimators = np.asarray(model.estimators_).ravel()
+        if hasattr(model, "learning_rate"):
+            # Gradient boosting: base prediction plus learning_rate * sum of trees
+            tree_weight = model.learning_rate
+            init = model.init_
+            base_score = 0.0 if init == "zero" else float(np.ravel(init.constant_)[0])
+        else:
+            # Random forest: mean of trees
+            tree_weight = 1.0 / len(estimators)
+            base_score = 0.0
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            leaf = tree.children_left == -1
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(leaf, node_ids, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += n_nodes
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), np.array(roots),
+            tree_weight=tree_weight, base_score=base_score
+        )
+
+    def predict_trees(self, X: np.ndarray, batch_size: int = 1024) -> np.ndarray:
+        """
+        Evaluate every tree on every row
+
+        Args:
+            X: Feature rows (N, n_features)
+            batch_size: Rows evaluated together, bounds the (rows, trees) working set
+
+        Returns:
+            (N, n_trees) array of leaf values
+        """
+        # Match scikit-learn, which compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        n_features = X.shape[1]
+        out = np.empty((X.shape[0], self.n_trees), dtype=np.float64)
+        for start in range(0, X.shape[0], batch_size):
+            rows = X[start:start + batch_size].ravel()
+            n_rows = len(rows) // n_features
+            # Offset of each row in the flattened batch, one per (row, tree) slot
+            row_offset = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+            node = np.tile(self.roots, n_rows)
+            for _ in range(self.max_depth):
+                go_right = rows.take(row_offset + self.feature.take(node)) > self.threshold.take(node)
+                node = self._children.take(2 * node + go_right)
+            out[start:start + n_rows] = self.value.take(node).reshape(n_rows, self.n_trees)
+        return out
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict one value per feature row"""
+        return self.base_score + self.tree_weight * self.predict_trees(X).sum(axis=1)
+
+    def to_arrays(self, prefix: str = "") -> dict:
+        """Export node arrays for ``np.savez``"""
+        return {
+            f"{prefix}feature": self.feature,
+            f"{prefix}threshold": self.threshold,
+            f"{prefix}left": self.left,
+            f"{prefix}right": self.right,
+            f"{prefix}value": self.value,
+            f"{prefix}roots": self.roots,
+            f"{prefix}params": np.array([self.tree_weight, self.base_score]),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str = "") -> "FlatTreeEnsemble":
+        """Rebuild an ensemble from arrays written by ``to_arrays``"""
+        tree_weight, base_score = arrays[f"{prefix}params"]
+        return cls(
+            arrays[f"{prefix}feature"], arrays[f"{prefix}threshold"],
+            arrays[f"{prefix}left"], arrays[f"{prefix}right"],
+            arrays[f"{prefix}value"], arrays[f"{prefix}roots"],
+            tree_weight=tree_weight, base_score=base_score
+        )
+
+
+class YieldEnsemble:
+    """Random Forest + Gradient Boosting yield ensemble over flat tree arrays"""
+
+    def __init__(self, forest: FlatTreeEnsemble, boosting: FlatTreeEnsemble, forest_weight: float = 0.5):
+        """
+        Args:
+            forest: Flattened Random Forest (also used for the confidence estimate)
+            boosting: Flattened Gradient Boosting model
+            forest_weight: Share of the forest in the blended prediction
+        """
+        self.forest = forest
+        self.boosting = boosting
+        self.forest_weight = float(forest_weight)
+
+    @classmethod
+    def from_sklearn(cls, forest_model, boosting_model, forest_weight: float = 0.5) -> "YieldEnsemble":
+        """Build from fitted scikit-learn models"""
+        return cls(FlatTreeEnsemble.from_sklearn(forest_model),
+                   FlatTreeEnsemble.from_sklearn(boosting_model),
+                   forest_weight=forest_weight)
+
+    def predict(self, X: np.ndarray) -> tuple:
+        """
+        Predict yield for a batch of feature rows
+
+        Args:
+            X: Feature rows (N, len(YIELD_FEATURES))
+
+        Returns:
+            (yield, confidence) arrays of shape (N,); confidence is 0-1 and
+            shrinks as the forest's trees disagree
+        """
+        forest_trees = self.forest.predict_trees(X)
+        forest_pred = forest_trees.mean(axis=1)
+        boosting_pred = self.boosting.predict(X)
+
+        predicted = self.forest_weight * forest_pred + (1 - self.forest_weight) * boosting_pred
+        spread = forest_trees.std(axis=1) / (np.abs(forest_pred) + 1e-7)
+        confidence = np.clip(1.0 - spread, 0.0, 1.0)
+        return predicted, confidence
+
+    def save(self, path: str) -> None:
+        """Save both models to a single .npz file"""
+        np.savez(path, forest_weight=np.array(self.forest_weight),
+                 **self.forest.to_arrays("rf_"), **self.boosting.to_arrays("gb_"))
+
+    @classmethod
+    def load(cls, path: str) -> "YieldEnsemble":
+        """Load models saved with ``save``"""
+        with np.load(path) as arrays:
+            return cls(FlatTreeEnsemble.from_arrays(arrays, "rf_"),
+                       FlatTreeEnsemble.from_arrays(arrays, "gb_"),
+                       forest_weight=float(arrays["forest_weight"]))
+
+
+def check_parity(flat: FlatTreeEnsemble, reference_model, X: np.ndarray) -> float:
+    """Return the largest absolute difference between flat and reference predictions"""
+    return float(np.max(np.abs(flat.predict(X) - reference_model.predict(X))))
+
+
+def yield_features(ndvi, ndre, gndvi, health_score, weed_coverage) -> np.ndarray:
+    """Stack per-field or per-zone values into rows ordered as YIELD_FEATURES"""
+    return np.column_stack(np.broadcast_arrays(
+        np.atleast_1d(ndvi), np.atleast_1d(ndre), np.atleast_1d(gndvi),
+        np.atleast_1d(health_score), np.atleast_1d(weed_coverage)
+    )).astype(np.float32)
+
+
+# Global yield ensemble instance (None when no trained ensemble is available)
+yield_engine = None
+
+def load_yield_engine(path: str):
+    """Load the yield ensemble, returning None when it is unavailable"""
+    global yield_engine
+    try:
+        yield_engine = YieldEnsemble.load(path)
+        logger.info(f"Yield ensemble loaded ({yield_engine.forest.n_trees} RF + "
+                    f"{yield_engine.boosting.n_trees} GB trees)")
+    except FileNotFoundError:
+        logger.warning(f"Yield ensemble not found at {path}, using health-score estimate")
+        yield_engine = None
+    except Exception as e:
+        logger.error(f"Error loading yield ensemble: {e}")
+        yield_engine = None
+    return yield_engine
+
+def get_yield_engine():
+    """Get yield ensemble instance"""
+    return yield_engine